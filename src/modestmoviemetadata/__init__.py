@@ -1,4 +1,10 @@
 #  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
+import time
+
 __version__ = "2.0.0b1"
+
+# The package is imported before any of the program's modules, so this is the
+# reference point for measuring the time taken to display the main window
+startup_time = time.perf_counter()
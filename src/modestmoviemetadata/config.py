@@ -22,4 +22,6 @@ except importlib.metadata.PackageNotFoundError:
 app_guid = "17ea3af5-1edc-478b-b0fc-00384af8b188"  # arbitrary UUID
 
 imdb_dataset_url = "https://datasets.imdbws.com/title.basics.tsv.gz"
+imdb_ratings_dataset_url = "https://datasets.imdbws.com/title.ratings.tsv.gz"
+imdb_akas_dataset_url = "https://datasets.imdbws.com/title.akas.tsv.gz"
 imdb_dataset_description_url = "https://developer.imdb.com/non-commercial-datasets/"
@@ -2,9 +2,15 @@
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
+import multiprocessing
+import os
 import sys
+import time
 from pathlib import Path
 
+from qtpy.QtCore import QTimer
+
+from modestmoviemetadata import startup_time
 from modestmoviemetadata.config import app_guid, application_name
 from modestmoviemetadata.tools.filetools import (
     program_appdata_directory,
@@ -23,9 +29,17 @@ try:
 except ImportError:
     myappid = None
 
+# When set, the program prints its time to first window and exits. Used by
+# tools/startup_benchmark.py.
+startup_benchmark_env_var = "MODEST_MOVIE_METADATA_STARTUP_BENCHMARK"
+
 
 def main():
-    logging_level = logging.DEBUG
+    # The dataset is parsed using worker processes, which in the frozen executable
+    # are started by running it again
+    multiprocessing.freeze_support()
+
+    logging_level = logging.INFO
     logger = setup_main_process_logging(
         appdata_path=program_appdata_directory(),
         alternate_path=Path(windows_user_profile_directory()),
@@ -36,7 +50,8 @@ def main():
     global app
     app = QtSingleApplication(app_guid, sys.argv)
     if app.isRunning():
-        logger.warning(f"{application_name} is already running")
+        logger.warning("%s is already running", application_name)
+        app.sendActivate()
         sys.exit(0)
 
     app.setOrganizationName(application_name)
@@ -45,6 +60,17 @@ def main():
 
     window = MainWindow()
     app.setActivationWindow(window)
+    app.setRequestHandler(window.queryServiceRequest)
+
+    def windowShown() -> None:
+        elapsed = time.perf_counter() - startup_time
+        logger.info("Time to first window: %.3f seconds", elapsed)
+        if os.environ.get(startup_benchmark_env_var, "") not in ("", "0"):
+            print(f"time_to_first_window={elapsed:.6f}", flush=True)
+            app.quit()
+
+    # Runs once the event loop has started and the window has been displayed
+    QTimer.singleShot(0, windowShown)
     code = app.exec()
     logging.debug("Exiting")
     sys.exit(code)
@@ -1,20 +1,226 @@
 #  SPDX-FileCopyrightText: 2022-2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
+"""
+Sound effects. The bundled MP3 files are decoded once to WAV files in the program's
+application data directory, and played using preloaded sound effects, so that
+playback starts immediately. Until a sound has been preloaded, it is played using a
+media player, which must open and decode the MP3 each time it plays.
+"""
 
+import os
+import wave
+from functools import cache
 from importlib.resources import files
+from pathlib import Path
 
-from qtpy.QtCore import QUrl
-from qtpy.QtMultimedia import QAudioOutput, QMediaPlayer
+from qtpy.QtCore import QObject, QTimer, QUrl, Slot
 
+from modestmoviemetadata.config import version
 from modestmoviemetadata.data import audio
+from modestmoviemetadata.tools.filetools import program_appdata_directory
+from modestmoviemetadata.tools.logtools import get_logger
 
-player = QMediaPlayer()
-audioOutput = QAudioOutput()
-player.setAudioOutput(audioOutput)
+logger = get_logger()
+
+
+def sound_path(soundfile: str) -> Path:
+    return Path(str(files(audio).joinpath(soundfile)))
+
+
+def sound_cache_directory() -> Path | None:
+    appdata = program_appdata_directory()
+    if appdata is None:
+        return None
+    directory = appdata / "sounds"
+    try:
+        directory.mkdir(exist_ok=True)
+    except OSError as e:
+        logger.error("Unable to create sound cache directory %s: %s", directory, e)
+        return None
+    return directory
+
+
+@cache
+def media_player():
+    """
+    Create the media player the first time a sound is played. QtMultimedia is slow
+    to import and initialize, so doing this at program startup delays the display
+    of the main window.
+    """
+
+    from qtpy.QtMultimedia import QAudioOutput, QMediaPlayer
+
+    player = QMediaPlayer()
+    audioOutput = QAudioOutput(player)
+    player.setAudioOutput(audioOutput)
+    return player
+
+
+class SoundCache(QObject):
+    """
+    Sound effects decoded to WAV files, one at a time, without blocking the GUI
+    thread
+    """
+
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self.effects = {}
+        self.pending: list[str] = []
+        self.decoder = None
+        self.decoding = ""
+        self.wav_path: Path | None = None
+        self.pcm = bytearray()
+        self.format = None
+
+    def preload(self, soundfiles: tuple[str, ...]) -> None:
+        self.pending.extend(
+            soundfile
+            for soundfile in soundfiles
+            if soundfile not in self.effects and soundfile not in self.pending
+        )
+        if self.decoder is None:
+            self.preloadNext()
+
+    def cached_wav_path(self, soundfile: str) -> Path | None:
+        directory = sound_cache_directory()
+        if directory is None:
+            return None
+        # Include the program version in the name, in case the bundled sound changes
+        return directory / f"{Path(soundfile).stem}-{version}.wav"
+
+    @Slot()
+    def preloadNext(self) -> None:
+        while self.pending:
+            soundfile = self.pending.pop(0)
+            wav_path = self.cached_wav_path(soundfile)
+            if wav_path is None:
+                self.pending.clear()
+                return
+            if wav_path.is_file():
+                self.addEffect(soundfile, wav_path)
+            else:
+                self.decode(soundfile, wav_path)
+                return
+
+    def decode(self, soundfile: str, wav_path: Path) -> None:
+        from qtpy.QtMultimedia import QAudioDecoder, QAudioFormat
+
+        logger.debug("Decoding %s", soundfile)
+        audio_format = QAudioFormat()
+        audio_format.setSampleFormat(QAudioFormat.SampleFormat.Int16)
+        audio_format.setSampleRate(44100)
+        audio_format.setChannelCount(2)
+
+        self.decoding = soundfile
+        self.wav_path = wav_path
+        self.pcm = bytearray()
+        self.format = None
+        self.decoder = QAudioDecoder(self)
+        self.decoder.setAudioFormat(audio_format)
+        self.decoder.bufferReady.connect(self.decoderBufferReady)
+        self.decoder.finished.connect(self.decoderFinished)
+        self.decoder.error.connect(self.decoderError)
+        self.decoder.setSource(QUrl.fromLocalFile(str(sound_path(soundfile))))
+        self.decoder.start()
+
+    @Slot()
+    def decoderBufferReady(self) -> None:
+        buffer = self.decoder.read()
+        if not buffer.isValid():
+            return
+        self.format = buffer.format()
+        self.pcm += bytes(buffer.constData())[: buffer.byteCount()]
+
+    @Slot()
+    def decoderFinished(self) -> None:
+        from qtpy.QtMultimedia import QAudioFormat
+
+        sample_width = {
+            QAudioFormat.SampleFormat.UInt8: 1,
+            QAudioFormat.SampleFormat.Int16: 2,
+            QAudioFormat.SampleFormat.Int32: 4,
+        }.get(self.format.sampleFormat() if self.format is not None else None)
+        if not self.pcm or sample_width is None:
+            logger.warning("Unable to decode %s to a WAV file", self.decoding)
+        else:
+            temp_path = self.wav_path.with_suffix(".tmp")
+            try:
+                with wave.open(str(temp_path), "wb") as wav:
+                    wav.setnchannels(self.format.channelCount())
+                    wav.setsampwidth(sample_width)
+                    wav.setframerate(self.format.sampleRate())
+                    wav.writeframes(self.pcm)
+                os.replace(temp_path, self.wav_path)
+            except OSError as e:
+                logger.error("Unable to write %s: %s", self.wav_path, e)
+            else:
+                self.removeStaleWavs(self.wav_path)
+                self.addEffect(self.decoding, self.wav_path)
+        self.decodingDone()
+
+    @Slot()
+    def decoderError(self) -> None:
+        logger.warning(
+            "Error decoding %s: %s", self.decoding, self.decoder.errorString()
+        )
+        self.decodingDone()
+
+    def decodingDone(self) -> None:
+        self.decoder.deleteLater()
+        self.decoder = None
+        self.pcm = bytearray()
+        # Decode the next sound on a later iteration of the event loop
+        QTimer.singleShot(0, self.preloadNext)
+
+    @staticmethod
+    def removeStaleWavs(wav_path: Path) -> None:
+        # WAV files decoded by previous versions of the program
+        stem = wav_path.stem.removesuffix(f"-{version}")
+        for path in wav_path.parent.glob(f"{stem}-*.wav"):
+            if path != wav_path:
+                path.unlink(missing_ok=True)
+
+    def addEffect(self, soundfile: str, wav_path: Path) -> None:
+        from qtpy.QtMultimedia import QSoundEffect
+
+        effect = QSoundEffect(self)
+        # Loads asynchronously
+        effect.setSource(QUrl.fromLocalFile(str(wav_path)))
+        self.effects[soundfile] = effect
+        logger.debug("Preloaded %s", soundfile)
+
+    def play(self, soundfile: str) -> bool:
+        """
+        :return: True if the sound was preloaded and is now playing
+        """
+
+        from qtpy.QtMultimedia import QSoundEffect
+
+        effect = self.effects.get(soundfile)
+        if effect is None or effect.status() != QSoundEffect.Status.Ready:
+            return False
+        effect.play()
+        return True
+
+
+@cache
+def sound_cache() -> SoundCache:
+    return SoundCache()
+
+
+def preload_sounds(soundfiles: tuple[str, ...]) -> None:
+    """
+    Decode and load the sounds in the background, so they can be played immediately
+    """
+
+    sound_cache().preload(soundfiles)
 
 
 def play_sound(soundfile: str) -> None:
+    if sound_cache().play(soundfile):
+        return
+    player = media_player()
     player.setSource(QUrl())
-    player.setSource(QUrl.fromLocalFile(str(files(audio).joinpath(soundfile))))
+    player.setSource(QUrl.fromLocalFile(str(sound_path(soundfile))))
     player.play()
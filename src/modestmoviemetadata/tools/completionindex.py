@@ -0,0 +1,283 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Memory-mapped index of titles for completing a title as it is typed, written
+alongside the database.
+
+The distinct titles are sorted by their casefolded UTF-8 encoding, so the titles
+starting with some text are found with a binary search, followed by reading the
+titles after the first match until one no longer matches, without touching SQLite
+at all.
+
+File layout, little endian:
+
+header
+    magic, format version, database build id, number of titles
+offsets
+    uint64 offsets into the records, one more than the number of titles
+records
+    for each title, the length of its key as a uint16, its key, i.e. its casefolded
+    UTF-8 encoded title, and then its UTF-8 encoded title
+
+The build id is also stored in the database. An index whose build id does not match
+the database's is ignored.
+"""
+
+import mmap
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator, Sequence
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from modestmoviemetadata.tools.filetools import imdb_completion_path, imdb_db_path
+from modestmoviemetadata.tools.idindex import HEADER, database_build_id
+from modestmoviemetadata.tools.logtools import get_logger
+
+logger = get_logger()
+
+MAGIC = b"MMMCMP\x00\x00"
+FORMAT_VERSION = 1
+KEY_LENGTH = struct.Struct("<H")
+
+# Default maximum number of completions offered
+COMPLETION_LIMIT = 20
+
+
+def completion_key(title: str) -> bytes:
+    # Keys longer than a uint16 can record are truncated, which affects only
+    # completions of text that long
+    return title.casefold().encode("utf-8")[:0xFFFF]
+
+
+def write_completion_index(
+    db_path: Path,
+    index_path: Path,
+    build_id: str,
+    excluded_types: Sequence[int] = (),
+) -> int:
+    """
+    Write the completion index for a database.
+
+    :param db_path: database to index
+    :param index_path: index file to create
+    :param build_id: build id of the database, a 32 character hexadecimal string
+    :param excluded_types: codes of title types whose titles are not offered, e.g.
+     episodes, whose titles are rarely what is searched for
+    :return: number of distinct titles indexed
+    """
+
+    logger.debug("Writing completion index %s", index_path)
+    offsets = array("Q", [0])
+    offset = 0
+    previous_key = None
+
+    with tempfile.TemporaryFile(dir=index_path.parent) as records:
+        with closing(sqlite3.connect(db_path)) as conn:
+            conn.create_function(
+                "completion_key", 1, completion_key, deterministic=True
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(titles)")]
+            where = "primary_title != ''"
+            params = tuple(excluded_types)
+            if params and "title_type" in columns:
+                placeholders = ", ".join("?" * len(params))
+                where += f" AND IFNULL(title_type, 0) NOT IN ({placeholders})"
+            else:
+                params = ()
+            # SQLite sorts the titles, spilling to temporary files if need be, so
+            # they are not all held in memory. Keys sort as bytes, as Python sorts
+            # them.
+            sql = f"""
+                SELECT DISTINCT completion_key(primary_title), primary_title
+                FROM titles WHERE {where} ORDER BY 1, 2
+                """
+            for key, title in conn.execute(sql, params):
+                # Of titles differing only in case, the one sorting first is offered
+                if key == previous_key:
+                    continue
+                previous_key = key
+                record = KEY_LENGTH.pack(len(key)) + key + title.encode("utf-8")
+                records.write(record)
+                offset += len(record)
+                offsets.append(offset)
+
+        count = len(offsets) - 1
+        if sys.byteorder != "little":
+            offsets.byteswap()
+
+        with open(index_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, bytes.fromhex(build_id), count))
+            offsets.tofile(f)
+            records.seek(0)
+            shutil.copyfileobj(records, f)
+
+    logger.debug("Completion index contains %s titles", count)
+    return count
+
+
+class CompletionIndex:
+    """Read-only view of a completion index file"""
+
+    def __init__(self, index_path: Path) -> None:
+        with open(index_path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, build_id, count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError(f"Unrecognized completion index format in {index_path}")
+        self.build_id = build_id.hex()
+        self.count = count
+
+        offsets_start = HEADER.size
+        self.records_start = offsets_start + (count + 1) * 8
+        self.offsets = memoryview(self.mm)[offsets_start : self.records_start].cast("Q")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> bytes:
+        """
+        :return: key of the i-th title, which lets bisect search the keys
+        """
+
+        start = self.records_start + self.offsets[i]
+        (length,) = KEY_LENGTH.unpack_from(self.mm, start)
+        start += KEY_LENGTH.size
+        return self.mm[start : start + length]
+
+    def title(self, i: int) -> str:
+        start = self.records_start + self.offsets[i]
+        (length,) = KEY_LENGTH.unpack_from(self.mm, start)
+        end = self.records_start + self.offsets[i + 1]
+        return self.mm[start + KEY_LENGTH.size + length : end].decode("utf-8")
+
+    def complete(self, text: str, limit: int = COMPLETION_LIMIT) -> list[str]:
+        """
+        :return: titles starting with the text, ignoring case, in alphabetical order
+        """
+
+        prefix = completion_key(text)
+        if not prefix:
+            return []
+        completions = []
+        i = bisect_left(self, prefix)
+        while i < self.count and len(completions) < limit:
+            if not self[i].startswith(prefix):
+                break
+            completions.append(self.title(i))
+            i += 1
+        return completions
+
+    def prefetch(self) -> None:
+        """Ask the operating system to read the index into memory in the background"""
+
+        # Not available on Windows
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self.mm.madvise(mmap.MADV_WILLNEED)
+
+    def close(self) -> None:
+        # Memory views must be released before the memory map can be closed
+        self.offsets.release()
+        self.mm.close()
+
+
+_lock = threading.Condition()
+_index: CompletionIndex | None = None
+_loaded = False
+# Number of threads using the index, which must not be closed while they do
+_users = 0
+# Whether completion_index_closed() is keeping the index closed
+_closed = False
+
+
+def load_completion_index(db_path: Path, index_path: Path) -> CompletionIndex | None:
+    if sys.byteorder != "little" or not index_path.is_file():
+        return None
+    try:
+        index = CompletionIndex(index_path)
+    except (OSError, ValueError) as e:
+        logger.warning("Unable to open completion index: %s", e)
+        return None
+    if index.build_id != database_build_id(db_path):
+        logger.warning("Ignoring completion index that does not match the database")
+        index.close()
+        return None
+    logger.debug("Using completion index %s", index_path)
+    return index
+
+
+@contextmanager
+def completion_index() -> Iterator[CompletionIndex | None]:
+    """
+    Yield the completion index for the database, or None if there is no valid
+    index, or while completion_index_closed() keeps it closed.
+
+    The index is opened once, and remains open until completion_index_closed()
+    closes it, which waits until no thread is using it.
+    """
+
+    global _index, _loaded, _users
+    with _lock:
+        if _closed:
+            index = None
+        else:
+            if not _loaded:
+                _index = load_completion_index(imdb_db_path(), imdb_completion_path())
+                _loaded = True
+            index = _index
+            if index is not None:
+                _users += 1
+    # The lock is not held while the index is used, so that closing the index does
+    # not wait on a thread that is itself waiting, e.g. on a database connection
+    try:
+        yield index
+    finally:
+        if index is not None:
+            with _lock:
+                _users -= 1
+                _lock.notify_all()
+
+
+@contextmanager
+def completion_index_closed() -> Iterator[None]:
+    """
+    Close the completion index, and keep it closed within the context, so that its file
+    can be replaced without a lookup reopening the old file meanwhile. It is
+    reopened when it is next used.
+    """
+
+    global _index, _loaded, _closed
+    with _lock:
+        _closed = True
+        # Lookups are brief, and never wait on anything while using the index
+        _lock.wait_for(lambda: not _users)
+        if _index is not None:
+            _index.close()
+        _index = None
+        _loaded = False
+    try:
+        yield
+    finally:
+        with _lock:
+            _closed = False
+
+
+def complete_title(text: str, limit: int = COMPLETION_LIMIT) -> list[str]:
+    """
+    :return: titles starting with the text, ignoring case, or an empty list if there
+     is no completion index
+    """
+
+    with completion_index() as index:
+        if index is None:
+            return []
+        return index.complete(text, limit)
@@ -1,29 +1,203 @@
 #  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import heapq
+import itertools
+import os
+import queue
 import shutil
 import sqlite3
 import tempfile
-from contextlib import closing
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from datetime import UTC, datetime
 from email.utils import parsedate_to_datetime
+from enum import Enum
 from pathlib import Path
 
-import requests
 from qtpy.QtCore import QUrl, SignalInstance
 
-from modestmoviemetadata.config import imdb_dataset_url
+from modestmoviemetadata.config import (
+    imdb_akas_dataset_url,
+    imdb_dataset_url,
+    imdb_ratings_dataset_url,
+)
+from modestmoviemetadata.tools.completionindex import completion_index
 from modestmoviemetadata.tools.filetools import (
     imdb_db_path,
     program_appdata_directory,
     standard_temp_directory,
 )
-from modestmoviemetadata.tools.imdbsqlite import create_db
+from modestmoviemetadata.tools.idindex import id_index
+from modestmoviemetadata.tools.imdbsqlite import (
+    TITLE_INDEX,
+    TITLE_TYPE_INDEX,
+    ImportCancelled,
+    build_index,
+    create_db,
+    title_type_codes,
+)
 from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.querytrace import tracer
+from modestmoviemetadata.tools.runreport import RunReport
 from modestmoviemetadata.tools.utilities import format_bytes
 
 logger = get_logger()
 
+# Datasets the database is converted from, the dataset of titles first
+dataset_urls = (imdb_dataset_url, imdb_ratings_dataset_url, imdb_akas_dataset_url)
+
+# Each thread that queries the database keeps its own read-only connection, which
+# is reopened when the database is replaced
+_read_connections = threading.local()
+_database_generation = 0
+# Every open read connection, so that all can be closed before the database file is
+# replaced, which on Windows is not possible while it is open. Threads' own
+# connections are also in _thread_connections, and while a thread is using its
+# connection, in _busy_connections.
+_open_connections: set[sqlite3.Connection] = set()
+_thread_connections: set[sqlite3.Connection] = set()
+_busy_connections: set[sqlite3.Connection] = set()
+# Notified when a connection is closed or no longer busy, and when the database has
+# been replaced
+_connections_changed = threading.Condition()
+_replacing = False
+
+# Maximum number of seconds to wait for connections to the database to be closed
+# before it is replaced
+CONNECTION_CLOSE_TIMEOUT = 10.0
+
+# Size of the chunks in which a dataset already on disk is read to compute its
+# digest
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+class ReadConnection(sqlite3.Connection):
+    """A read-only connection, which is unregistered when it is closed"""
+
+    def close(self) -> None:
+        # Serialized with read_connections_closed(), which may interrupt it
+        with _connections_changed:
+            super().close()
+            _open_connections.discard(self)
+            _thread_connections.discard(self)
+            _connections_changed.notify_all()
+
+
+def open_read_connection(check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Open a read-only connection to the database. While the database is being
+    replaced, wait until it has been, so that the connection is to the new
+    database. The connection must be closed by the caller.
+
+    :param check_same_thread: whether only the thread that opened the connection
+     may use or close it
+    :return: a new read-only connection to the database
+    """
+
+    with _connections_changed:
+        _connections_changed.wait_for(lambda: not _replacing)
+        conn = sqlite3.connect(
+            f"{imdb_db_path().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=check_same_thread,
+            factory=ReadConnection,
+        )
+        _open_connections.add(conn)
+    return conn
+
+
+@contextmanager
+def read_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Yield the calling thread's read-only connection to the database, which is in
+    use within the context.
+
+    If the database is replaced while the connection is in use, the query running
+    on it is interrupted, and the connection is closed when the context exits.
+
+    :raises QueryCancelled: the query was interrupted because the database is being
+     replaced
+    """
+
+    with _connections_changed:
+        conn = getattr(_read_connections, "conn", None)
+        depth = getattr(_read_connections, "depth", 0)
+        # A connection in use further up the stack is used even if the database is
+        # being replaced, because the replacement waits for it to be closed
+        if conn is None or (
+            depth == 0 and _read_connections.generation != _database_generation
+        ):
+            # A connection of a previous database has already been closed
+            conn = open_read_connection(check_same_thread=False)
+            _thread_connections.add(conn)
+            _read_connections.conn = conn
+            _read_connections.generation = _database_generation
+        _read_connections.depth = depth + 1
+        _busy_connections.add(conn)
+    try:
+        yield conn
+    except sqlite3.OperationalError as e:
+        if _read_connections.generation != _database_generation:
+            raise QueryCancelled("database replaced") from e
+        raise
+    finally:
+        with _connections_changed:
+            _read_connections.depth -= 1
+            if not _read_connections.depth:
+                _busy_connections.discard(conn)
+                if _read_connections.generation != _database_generation:
+                    conn.close()
+                    _read_connections.conn = None
+                _connections_changed.notify_all()
+
+
+@contextmanager
+def read_connections_closed() -> Iterator[None]:
+    """
+    Close every read connection, and keep new ones from being opened within the
+    context, so that the database file can be replaced.
+
+    Queries running on the connections are interrupted. Connections not in use are
+    closed at once, and those in use are closed by the code using them, which is
+    waited for. Each thread opens a new connection when it next queries the
+    database.
+    """
+
+    global _database_generation, _replacing
+    with _connections_changed:
+        _replacing = True
+        _database_generation += 1
+        for conn in _open_connections:
+            conn.interrupt()
+        for conn in _thread_connections - _busy_connections:
+            conn.close()
+        if not _connections_changed.wait_for(
+            lambda: not _open_connections, CONNECTION_CLOSE_TIMEOUT
+        ):
+            logger.warning(
+                "%s database connections are still open", len(_open_connections)
+            )
+    try:
+        yield
+    finally:
+        with _connections_changed:
+            _replacing = False
+            _connections_changed.notify_all()
+
+
+def database_generation() -> int:
+    """
+    :return: a number that changes each time the database is replaced
+    """
+
+    return _database_generation
+
 
 def convert_last_modified_header(web_mtime: str) -> datetime:
     """
@@ -46,6 +220,10 @@ def download_needed(last_modified: str, url: str) -> bool:
         logger.error("Invalid Last Modified ISO date time value %s", last_modified)
         return True
 
+    # requests is slow to import, so it is imported only when it is first needed,
+    # rather than when the program starts
+    import requests
+
     response = requests.head(url, timeout=5)
     web_mtime = response.headers.get("Last-Modified")
 
@@ -66,17 +244,37 @@ def download_needed(last_modified: str, url: str) -> bool:
 
 
 def do_download(
-    url: str, name: str, path: Path, progress_callback: SignalInstance
-) -> str:
+    url: str,
+    name: str,
+    path: Path,
+    progress_callback: SignalInstance,
+    cancel_event: threading.Event | None = None,
+    report: RunReport | None = None,
+) -> tuple[str, str]:
+    """
+    Download the dataset. Its file modification time is set to the server's
+    Last-Modified time, so that it can be reused if its conversion does not complete.
+
+    :return: the dataset's Last-Modified time in ISO format, or an empty string if
+     the server did not provide it, and the SHA-256 digest of its content
+    """
+
+    import requests
+
     logger.debug("Downloading %s", name)
+    report = report or RunReport()
 
-    with requests.get(url, stream=True, timeout=15) as response:
+    with (
+        report.span("download") as span,
+        requests.get(url, stream=True, timeout=15) as response,
+    ):
         response.raise_for_status()
 
         # Fetch total file size and file modification time from response header
         total_size = int(response.headers.get("content-length", 0))
         downloaded_size = 0
         web_mtime = response.headers.get("Last-Modified")
+        digest = hashlib.sha256()
 
         progress_callback.emit(
             (
@@ -92,42 +290,177 @@ def do_download(
                 for chunk in response.iter_content(chunk_size=8192):
                     if chunk:
                         f.write(chunk)
+                        digest.update(chunk)
                         downloaded_size += len(chunk)
+                        span.bytes += len(chunk)
                         progress_callback.emit(("", downloaded_size, -1))
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ImportCancelled(url)
 
             logger.debug("Download completed successfully")
 
+            last_modified_iso = ""
+            if web_mtime:
+                web_dt = convert_last_modified_header(web_mtime)
+                last_modified_iso = web_dt.isoformat()
+                os.utime(temp_path, (web_dt.timestamp(), web_dt.timestamp()))
+
             logger.debug("Moving temporary download to %s", path)
             if path.is_file():
                 path.unlink()
             shutil.move(temp_path, path)
 
-        if web_mtime:
-            return convert_last_modified_header(web_mtime).isoformat()
+        return last_modified_iso, digest.hexdigest()
+
+
+def file_digest(path: Path, cancel_event: threading.Event | None = None) -> str:
+    """
+    :return: the SHA-256 digest of the file's content
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(DIGEST_CHUNK_SIZE):
+            digest.update(chunk)
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled(str(path))
+    return digest.hexdigest()
+
+
+def database_digest() -> str:
+    """
+    :return: the digest of the dataset the database was converted from, or an empty
+     string if the database does not exist or did not record it
+    """
+
+    if not imdb_db_path().exists():
+        return ""
+    # A connection of its own, so that it is not left open when the database is
+    # replaced
+    try:
+        with closing(open_read_connection()) as conn:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'dataset_digest'"
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.debug("Unable to read the database's dataset digest: %s", e)
         return ""
+    return row[0] if row else ""
+
+
+def dataset_last_modified(path: Path) -> str:
+    """
+    :return: the Last-Modified time of a dataset already on disk, in ISO format
+    """
 
+    return datetime.fromtimestamp(int(path.stat().st_mtime), UTC).isoformat()
+
+
+def download_and_convert(
+    last_modified: str,
+    progress_callback: SignalInstance,
+    cancel_event: threading.Event | None = None,
+    title_index: bool = False,
+):
+    """
+    Download the datasets if the server has a newer dataset of titles, or if there
+    is no database, and convert them into the database.
+
+    A dataset left on disk by a conversion that did not complete is reused rather
+    than downloaded again, unless the server has a newer one. Datasets whose
+    content is the same as those the database was converted from are not
+    converted again.
+
+    :return: the Last-Modified time of the dataset of titles the database is
+     converted from, or "ALREADY_DOWNLOADED" if the database is up to date
+    """
 
-def download_and_convert(last_modified: str, progress_callback: SignalInstance):
     appdata = program_appdata_directory()
     assert appdata is not None
 
-    url = imdb_dataset_url
-    name = QUrl(url).path().lstrip("/")
-    path = appdata / name
+    urls = dataset_urls
+    paths = [appdata / QUrl(url).path().lstrip("/") for url in urls]
+    report = RunReport()
 
-    db_create = download_needed(last_modified, url) or not imdb_db_path().exists()
+    with report.span("head_check"):
+        reuse_datasets = [
+            path.is_file() and not download_needed(dataset_last_modified(path), url)
+            for url, path in zip(urls, paths, strict=True)
+        ]
+        db_create = (
+            reuse_datasets[0]
+            or download_needed(last_modified, urls[0])
+            or not imdb_db_path().exists()
+        )
     if db_create:
-        last_modified_iso = do_download(url, name, path, progress_callback)
-        create_db(dataset=path, progress_callback=progress_callback)
+        status = "failed"
+        try:
+            digests = []
+            last_modified_iso = ""
+            for url, path, reuse_dataset in zip(
+                urls, paths, reuse_datasets, strict=True
+            ):
+                if reuse_dataset:
+                    logger.info("Reusing %s already downloaded", path.name)
+                    progress_callback.emit(("Examining dataset...", 0, 0))
+                    dataset_modified = dataset_last_modified(path)
+                    with report.span("digest") as span:
+                        digests.append(file_digest(path, cancel_event))
+                        span.bytes += path.stat().st_size
+                else:
+                    dataset_modified, digest = do_download(
+                        url, path.name, path, progress_callback, cancel_event, report
+                    )
+                    digests.append(digest)
+                last_modified_iso = last_modified_iso or dataset_modified
+            digest = combined_digest(digests)
+            report.info["dataset"] = ", ".join(path.name for path in paths)
+            report.info["dataset_last_modified"] = last_modified_iso
+            report.info["dataset_digest"] = digest
+            if digest == database_digest():
+                logger.info("IMDb datasets are unchanged: not converting them")
+                for path in paths:
+                    path.unlink()
+                status = "unchanged"
+            else:
+                create_db(
+                    dataset=paths[0],
+                    progress_callback=progress_callback,
+                    title_index=title_index,
+                    cancel_event=cancel_event,
+                    report=report,
+                    dataset_digest=digest,
+                    replacing=read_connections_closed,
+                )
+                status = "completed"
+        except ImportCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            report.write(appdata, status)
         return last_modified_iso
     else:
         logger.debug("Most recent IMDb dataset already downloaded")
         return "ALREADY_DOWNLOADED"
 
 
+def combined_digest(digests: list[str]) -> str:
+    """
+    :return: a digest of the datasets' digests, which changes if any of them does
+    """
+
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256("".join(digests).encode("ascii")).hexdigest()
+
+
 def dataset_downward_size(progress_callback: SignalInstance) -> int:
-    response = requests.head(imdb_dataset_url, timeout=5)
-    return int(response.headers.get("content-length", 0))
+    import requests
+
+    return sum(
+        int(requests.head(url, timeout=5).headers.get("content-length", 0))
+        for url in dataset_urls
+    )
 
 
 def database_exists() -> bool:
@@ -139,56 +472,974 @@ def database_exists() -> bool:
 
 
 def query_by_imdb_id(imdb_id: str) -> tuple[str, int] | None:
-    with closing(sqlite3.connect(imdb_db_path())) as conn:
-        c = conn.cursor()
-        c.execute(
-            """
+    with id_index() as index:
+        if index is not None:
+            with tracer.trace("id_index") as trace:
+                row = index.lookup(imdb_id)
+                trace.rows = int(row is not None)
+            return row
+
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        sql = """
             SELECT primary_title, premiered FROM titles WHERE title_id = ?
-            """,
-            (imdb_id,),
-        )
-        row = c.fetchone()
+            """
+        params = (imdb_id,)
+        with tracer.trace("imdb_id", conn, sql, params) as trace:
+            c.execute(sql, params)
+            row = c.fetchone()
+            trace.rows = int(row is not None)
         return row
 
 
-def query_by_title(title: str) -> list[tuple[str, int, str]]:
-    with closing(sqlite3.connect(imdb_db_path())) as conn:
-        c = conn.cursor()
-        formatted_search = f"%{title}%"
+def query_by_imdb_ids(imdb_ids: list[str]) -> dict[str, tuple[str, int | None]]:
+    """
+    Look up several titles at once
+
+    :return: title and year of each IMDb id found
+    """
+
+    with id_index() as index:
+        if index is not None:
+            with tracer.trace("id_index_batch") as trace:
+                rows = {}
+                for imdb_id in imdb_ids:
+                    row = index.lookup(imdb_id)
+                    if row is not None:
+                        rows[imdb_id] = row
+                trace.rows = len(rows)
+            return rows
+
+    rows = {}
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        # Stay well within SQLite's limit on the number of parameters in a query
+        for start in range(0, len(imdb_ids), 500):
+            params = tuple(imdb_ids[start : start + 500])
+            sql = f"""
+                SELECT title_id, primary_title, premiered FROM titles
+                WHERE title_id IN ({", ".join("?" * len(params))})
+                """
+            with tracer.trace("imdb_id_batch", conn, sql, params) as trace:
+                c.execute(sql, params)
+                for imdb_id, title, year in c:
+                    rows[imdb_id] = (title, year)
+                    trace.rows += 1
+    return rows
+
+
+# Number of titles a ranked title search returns
+RANKED_SEARCH_LIMIT = 50
+
+# Maximum number of threads a title search scans the titles table with
+MAX_SEARCH_WORKERS = 8
+# Number of ranges of rows of the titles table per thread, so that threads that
+# finish early can scan the remaining ranges, and titles in the first ranges can be
+# shown while the rest are scanned
+SEARCH_PARTITIONS_PER_WORKER = 4
+# Number of batches of titles found in a range of rows that are held until they are
+# yielded. A range's search waits while this many are held.
+PARTITION_QUEUE_BATCHES = 4
+# Seconds between checks of whether a search waiting to hold a batch was stopped
+PARTITION_QUEUE_TIMEOUT = 0.1
+
+
+class QueryCancelled(Exception):
+    """
+    A query was abandoned because a newer query superseded it, or because the
+    database is being replaced
+    """
+
+
+class QueryBudget:
+    """
+    Cancellation flag and time budget for a potentially slow query.
+
+    Installed as a connection's SQLite progress handler, it aborts the statement
+    that is executing as soon as the query is cancelled or its time budget is
+    exhausted.
+    """
+
+    # Number of SQLite virtual machine instructions between progress handler calls.
+    # Small enough that a cancelled query is aborted within a millisecond or two.
+    granularity = 1000
+
+    def __init__(
+        self,
+        cancel_event: threading.Event | None = None,
+        time_budget: float | None = None,
+    ) -> None:
+        """
+        :param cancel_event: when set, the query is cancelled
+        :param time_budget: maximum number of seconds the query may run, or None
+         for no limit
+        """
+        self.cancel_event = cancel_event or threading.Event()
+        self.time_budget = time_budget
+        self.deadline: float | None = None
+
+    def start(self) -> None:
+        """
+        Start the time budget, unless it has already started. The queries of a
+        search that makes several share its time budget.
+        """
+
+        if self.time_budget and self.deadline is None:
+            self.deadline = time.monotonic() + self.time_budget
+
+    def install(self, conn: sqlite3.Connection) -> None:
+        self.start()
+        conn.set_progress_handler(self, self.granularity)
+
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def __call__(self) -> int:
+        # A non-zero return value interrupts the query
+        return int(self.cancelled() or self.expired())
+
+
+class TitleScope(Enum):
+    """The kinds of title a title search finds"""
+
+    ALL = "all"
+    MOVIES = "movies"
+    SERIES = "series"
+
+    def type_codes(self) -> tuple[int, ...] | None:
+        """
+        :return: codes of the title types in the scope, or None for all types
+        """
+
+        types = {
+            TitleScope.MOVIES: (
+                "movie",
+                "short",
+                "tvMovie",
+                "tvSpecial",
+                "tvShort",
+                "video",
+            ),
+            TitleScope.SERIES: ("tvSeries", "tvMiniSeries"),
+        }.get(self)
+        if types is None:
+            return None
+        return tuple(title_type_codes[t] for t in types)
+
+
+def title_types_exist() -> bool:
+    """
+    :return: whether the titles table has the title type, which databases converted
+     by earlier versions of the program do not
+    """
+
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        c.execute("PRAGMA table_info(titles)")
+        return any(row[1] == "title_type" for row in c)
+
+
+def scope_applies(scope: TitleScope) -> bool:
+    """
+    :return: whether searches are restricted to the scope. A scope is ignored if the
+     database lacks title types.
+    """
+
+    return scope.type_codes() is not None and title_types_exist()
+
+
+def scoped_titles(scope: TitleScope) -> str:
+    """
+    :return: the titles table, aliased t, for a search that scans it. Scoped scans
+     read the scope's part of the index of title types and titles instead, and
+     read a title's row only if its title matches. The query planner prefers the
+     table when the scope's types are a large share of its rows, but the index is
+     faster even then.
+    """
+
+    if scope_applies(scope):
+        return f"titles AS t INDEXED BY {TITLE_TYPE_INDEX}"
+    return "titles AS t"
+
+
+def title_filter(year: int | None, scope: TitleScope) -> tuple[str, tuple]:
+    """
+    :return: conditions on the titles table, aliased t, that restrict titles to the
+     year, give or take one year, and to the scope, and their parameters
+    """
+
+    sql = ""
+    params = ()
+    if scope_applies(scope):
+        codes = scope.type_codes()
+        sql += f"AND t.title_type IN ({', '.join('?' * len(codes))}) "
+        params += codes
+    if year:
         # Convert NULL years to 0, which is important when comparing years via
         # integer comparison
-        c.execute(
+        sql += "AND IFNULL(t.premiered, 0) BETWEEN ? AND ? "
+        params += (year - 1, year + 1)
+    return sql, params
+
+
+def like_prefix(text: str) -> str:
+    """
+    :return: LIKE pattern matching text starting with the text, for use with
+     ESCAPE '\\'
+    """
+
+    for c in "\\%_":
+        text = text.replace(c, f"\\{c}")
+    return f"{text}%"
+
+
+def like_contains(text: str) -> str:
+    """
+    :return: LIKE pattern matching text containing the text, for use with
+     ESCAPE '\\'
+    """
+
+    return f"%{like_prefix(text)}"
+
+
+def iter_title_search(
+    kind: str,
+    title: str,
+    sql: str,
+    params: tuple,
+    budget: QueryBudget,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+) -> Iterator[list]:
+    """
+    Yield batches of the rows of a title search, as SQLite finds them.
+
+    When a row_factory is given, it is called with the cursor and each row, and the
+    batches contain what it returns.
+
+    When the time budget is exhausted, the search stops early with the results found
+    so far. The traced query time includes the time the caller spends processing
+    each batch.
+
+    :param kind: name of the query in the query trace
+    :param title: text searched for
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        # Set on the cursor only, so the query plan sample is unaffected
+        if row_factory is not None:
+            c.row_factory = row_factory
+        try:
+            with tracer.trace(kind, conn, sql, params) as trace:
+                budget.install(conn)
+                c.execute(sql, params)
+                while rows := c.fetchmany(batch_size):
+                    trace.rows += len(rows)
+                    yield rows
+                    if budget.cancelled():
+                        raise QueryCancelled(title)
+        except sqlite3.OperationalError as e:
+            if budget.cancelled():
+                raise QueryCancelled(title) from e
+            if budget.expired():
+                logger.warning(
+                    "Search for %s stopped after exhausting its time budget of %s "
+                    "seconds",
+                    title,
+                    budget.time_budget,
+                )
+                return
+            raise
+        finally:
+            # The connection is reused by later queries
+            conn.set_progress_handler(None, 0)
+
+
+def iter_query_by_title(
+    title: str,
+    budget: QueryBudget,
+    year: int | None = None,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+    scope: TitleScope = TitleScope.ALL,
+) -> Iterator[list]:
+    """
+    Yield batches of titles whose primary title contains the search text, as SQLite
+    finds them.
+
+    Each row is (primary_title, year, title_id), with unknown years as 0.
+
+    :param year: if given, only titles from this year, give or take one year, match
+    :param scope: kinds of title to find. A scoped search reads only the scope's
+     part of the index of title types and titles, rather than the whole table.
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    filter_sql, filter_params = title_filter(year, scope)
+    sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id
+        FROM {scoped_titles(scope)}
+        WHERE t.primary_title LIKE ? ESCAPE '\\' {filter_sql}
+        """
+    params = (like_contains(title),) + filter_params
+    yield from iter_title_search(
+        "title_search", title, sql, params, budget, row_factory, batch_size
+    )
+
+
+def iter_query_by_aka(
+    title: str,
+    budget: QueryBudget,
+    year: int | None = None,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+    scope: TitleScope = TitleScope.ALL,
+) -> Iterator[list]:
+    """
+    Yield batches of titles with an alternate title, e.g. a title used in another
+    country, that starts with the search text, and whose primary title does not
+    contain it, i.e. the titles iter_query_by_title() does not find.
+
+    The alternate titles are found using their index, so unlike a search of
+    primary titles, the search does not scan a table.
+
+    Each row is (primary_title, year, title_id), with unknown years as 0.
+
+    :param year: if given, only titles from this year, give or take one year, match
+    :param scope: kinds of title to find
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    filter_sql, filter_params = title_filter(year, scope)
+    # CROSS JOIN keeps akas as the outer loop, so it is searched using its index
+    sql = f"""
+        SELECT DISTINCT t.primary_title, IFNULL(t.premiered, 0), t.title_id
+        FROM akas AS a CROSS JOIN titles AS t ON t.title_id = a.title_id
+        WHERE a.title LIKE ? ESCAPE '\\' AND t.primary_title NOT LIKE ? ESCAPE '\\'
+        {filter_sql}
+        """
+    params = (like_prefix(title), like_contains(title)) + filter_params
+    yield from iter_title_search(
+        "aka_search", title, sql, params, budget, row_factory, batch_size
+    )
+
+
+def rowid_partitions(
+    conn: sqlite3.Connection, partitions: int
+) -> list[tuple[int, int]]:
+    """
+    Divide the titles table into ranges of rowids of roughly equal size, so it can
+    be scanned in parallel
+
+    :return: first and last rowid of each range
+    """
+
+    first, last = conn.execute(
+        "SELECT IFNULL(MIN(rowid), 0), IFNULL(MAX(rowid), -1) FROM titles"
+    ).fetchone()
+    size = max(1, -(-(last - first + 1) // partitions))
+    return [
+        (start, min(start + size - 1, last)) for start in range(first, last + 1, size)
+    ]
+
+
+def default_search_workers() -> int:
+    """
+    :return: number of threads to scan the titles table with
+    """
+
+    return max(1, min(MAX_SEARCH_WORKERS, os.cpu_count() or 1))
+
+
+def put_batch(
+    batches: queue.Queue, batch: list | None, stopped: threading.Event
+) -> bool:
+    """
+    Put a batch of rows in the queue, waiting while it is full
+
+    :return: False if the search was stopped before the batch could be put
+    """
+
+    while not stopped.is_set():
+        try:
+            batches.put(batch, timeout=PARTITION_QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def query_title_partition(
+    sql: str,
+    params: tuple,
+    first: int,
+    last: int,
+    budget: QueryBudget,
+    stopped: threading.Event,
+    batches: queue.Queue,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+) -> int:
+    """
+    Run a title search on a range of rows of the titles table, using a connection
+    of its own, and put batches of the rows found in the queue, followed by None.
+    Called in a worker thread.
+
+    The queue is bounded, so the search waits while the caller has yet to take the
+    range's earlier batches.
+
+    :param stopped: when set, the search stops, e.g. because its results are no
+     longer wanted
+    :return: number of rows found, which are those found so far if the search was
+     stopped, cancelled or its time budget exhausted
+    """
+
+    found = 0
+    try:
+        with closing(open_read_connection()) as conn, closing(conn.cursor()) as c:
+            generation = _database_generation
+            if row_factory is not None:
+                c.row_factory = row_factory
+            budget.start()
+            conn.set_progress_handler(
+                lambda: int(stopped.is_set() or budget()), budget.granularity
+            )
+            params += (first, last)
+            try:
+                with tracer.trace("title_partition_search", conn, sql, params) as trace:
+                    c.execute(sql, params)
+                    while rows := c.fetchmany(batch_size):
+                        found += len(rows)
+                        trace.rows = found
+                        if not put_batch(batches, rows, stopped):
+                            break
+            except sqlite3.OperationalError as e:
+                if generation != _database_generation:
+                    raise QueryCancelled("database replaced") from e
+                if not (stopped.is_set() or budget.cancelled() or budget.expired()):
+                    raise
+    finally:
+        put_batch(batches, None, stopped)
+    return found
+
+
+def iter_partitioned_title_search(
+    title: str,
+    sql: str,
+    params: tuple,
+    budget: QueryBudget,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+    workers: int | None = None,
+) -> Iterator[list]:
+    """
+    Yield batches of the rows of a title search, with the titles table divided into
+    ranges of rows that are scanned in parallel. SQLite does not hold the GIL while
+    it scans, so the search takes less time the more cores there are.
+
+    Rows are yielded in storage order. No more ranges are scanned at once than
+    there are threads, and each holds at most PARTITION_QUEUE_BATCHES batches until
+    they are yielded, so the memory the search uses does not grow with the number
+    of titles found.
+
+    :param sql: query of the titles table as t, ending with a condition that
+     t.rowid is BETWEEN two parameters, which are the first and last rowid of a range
+    :param workers: number of threads to scan with, or None to choose according to
+     the number of CPU cores
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    workers = workers or default_search_workers()
+    with read_connection() as conn:
+        partitions = iter(
+            rowid_partitions(conn, workers * SEARCH_PARTITIONS_PER_WORKER)
+        )
+
+    budget.start()
+    stopped = threading.Event()
+    # Ranges being scanned or waiting to be yielded, in storage order
+    scanning = deque()
+    with (
+        tracer.trace("partitioned_title_search") as trace,
+        ThreadPoolExecutor(max_workers=workers) as executor,
+    ):
+
+        def scan_next() -> None:
+            for first, last in itertools.islice(partitions, 1):
+                batches = queue.Queue(maxsize=PARTITION_QUEUE_BATCHES)
+                future = executor.submit(
+                    query_title_partition,
+                    sql,
+                    params,
+                    first,
+                    last,
+                    budget,
+                    stopped,
+                    batches,
+                    row_factory,
+                    batch_size,
+                )
+                scanning.append((future, batches))
+
+        try:
+            for _ in range(workers):
+                scan_next()
+            while scanning:
+                future, batches = scanning[0]
+                while (rows := batches.get()) is not None:
+                    trace.rows += len(rows)
+                    yield rows
+                    if budget.cancelled():
+                        raise QueryCancelled(title)
+                # Raise any error the range's search raised
+                future.result()
+                scanning.popleft()
+                if budget.cancelled():
+                    raise QueryCancelled(title)
+                if budget.expired():
+                    logger.warning(
+                        "Search for %s stopped after exhausting its time budget of %s "
+                        "seconds",
+                        title,
+                        budget.time_budget,
+                    )
+                    return
+                scan_next()
+        finally:
+            # Stop scanning ranges whose titles will not be yielded, e.g. when the
+            # caller stops early
+            stopped.set()
+
+
+def iter_partitioned_query_by_title(
+    title: str,
+    budget: QueryBudget,
+    year: int | None = None,
+    row_factory: Callable | None = None,
+    batch_size: int = 500,
+    workers: int | None = None,
+) -> Iterator[list]:
+    """
+    Yield batches of titles whose primary title contains the search text, like
+    iter_query_by_title(), but scanning the titles table in parallel. Titles are
+    yielded in the same order as iter_query_by_title() yields them.
+
+    :param year: if given, only titles from this year, give or take one year, match
+    :param workers: number of threads to scan with, or None to choose according to
+     the number of CPU cores
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    filter_sql, filter_params = title_filter(year, TitleScope.ALL)
+    sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id FROM titles AS t
+        WHERE t.primary_title LIKE ? ESCAPE '\\' {filter_sql}
+        AND t.rowid BETWEEN ? AND ?
+        """
+    params = (like_contains(title),) + filter_params
+    yield from iter_partitioned_title_search(
+        title, sql, params, budget, row_factory, batch_size, workers
+    )
+
+
+def query_by_title(title: str) -> list[tuple[str, int, str]]:
+    return [
+        row
+        for rows in iter_partitioned_query_by_title(title, QueryBudget())
+        for row in rows
+    ]
+
+
+def table_has_rows(table: str) -> bool:
+    """
+    :return: whether the table exists and has rows. Databases converted by earlier
+     versions of the program lack some tables.
+    """
+
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        sql = f"SELECT 1 FROM {table} LIMIT 1"
+        try:
+            with tracer.trace("table_has_rows", conn, sql) as trace:
+                c.execute(sql)
+                row = c.fetchone()
+                trace.rows = int(row is not None)
+        except sqlite3.OperationalError:
+            return False
+        return row is not None
+
+
+def ratings_exist() -> bool:
+    return table_has_rows("ratings")
+
+
+def akas_exist() -> bool:
+    return table_has_rows("akas")
+
+
+def query_votes_by_imdb_ids(imdb_ids: list[str]) -> dict[str, int]:
+    """
+    :return: number of votes of each of the titles that has ratings
+    """
+
+    votes = {}
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        # Stay well within SQLite's limit on the number of parameters in a query
+        for start in range(0, len(imdb_ids), 500):
+            params = tuple(imdb_ids[start : start + 500])
+            sql = f"""
+                SELECT title_id, num_votes FROM ratings
+                WHERE title_id IN ({", ".join("?" * len(params))})
+                """
+            with tracer.trace("votes_batch", conn, sql, params) as trace:
+                c.execute(sql, params)
+                for imdb_id, num_votes in c:
+                    votes[imdb_id] = num_votes
+                    trace.rows += 1
+    return votes
+
+
+def iter_title_candidates(
+    title: str,
+    budget: QueryBudget,
+    year: int | None = None,
+    workers: int | None = None,
+) -> Iterator[list[tuple]]:
+    """
+    Yield batches of titles whose primary title contains the search text, with their
+    number of votes, for iter_query_ranked_by_title() to rank, scanning the titles
+    table in parallel.
+
+    Each row is (primary_title, year, title_id, num_votes), with unknown years as 0,
+    and num_votes None for titles without ratings.
+
+    :param year: if given, only titles from this year, give or take one year, match
+    :param workers: number of threads to scan with, or None to choose according to
+     the number of CPU cores
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    filter_sql, filter_params = title_filter(year, TitleScope.ALL)
+    sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id, r.num_votes
+        FROM titles AS t LEFT JOIN ratings AS r ON r.title_id = t.title_id
+        WHERE t.primary_title LIKE ? ESCAPE '\\' {filter_sql}
+        AND t.rowid BETWEEN ? AND ?
+        """
+    params = (like_contains(title),) + filter_params
+    yield from iter_partitioned_title_search(
+        title, sql, params, budget, workers=workers
+    )
+
+
+class RankedCandidates:
+    """
+    The candidates of a ranked title search that may be among its results: titles
+    whose whole title matches the search and the most voted for titles, each in
+    order of the number of votes, and the first titles without ratings. Other
+    candidates are not held.
+    """
+
+    def __init__(self, title: str, limit: int) -> None:
+        self.folded = title.casefold()
+        self.limit = limit
+        # Heaps of (votes, -position, row), so that of titles with as many votes,
+        # those found first are kept
+        self.exact = []
+        self.rated = []
+        self.unrated = []
+        self.position = 0
+
+    def add(self, rows: list[tuple]) -> None:
+        for primary_title, year, title_id, votes in rows:
+            self.position += 1
+            row = (primary_title, year, title_id, primary_title)
+            if (primary_title or "").casefold() == self.folded:
+                self.push(self.exact, (votes or 0, -self.position, row))
+            elif votes is None:
+                if len(self.unrated) < self.limit:
+                    self.unrated.append(row)
+            else:
+                self.push(self.rated, (votes, -self.position, row))
+
+    def push(self, heap: list, item: tuple) -> None:
+        if len(heap) < self.limit:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    @staticmethod
+    def most_voted(heap: list) -> list[tuple]:
+        """
+        :param heap: titles whose whole title matches, or the other rated titles
+        :return: the titles, most voted for first
+        """
+
+        return [row for *_, row in sorted(heap, reverse=True)]
+
+
+def iter_query_ranked_by_title(
+    title: str,
+    budget: QueryBudget,
+    year: int | None = None,
+    limit: int = RANKED_SEARCH_LIMIT,
+    scope: TitleScope = TitleScope.ALL,
+    candidates: Iterable[list[tuple]] | None = None,
+) -> Iterator[list[tuple[str, int, str]]]:
+    """
+    Yield batches of the titles matching the search that the user most likely
+    wants: titles whose whole title or alternate title matches the search first,
+    then the most voted for titles, then titles with an alternate title starting
+    with the search text, then titles without ratings. Each batch holds the titles
+    one step of the search finds, best first.
+
+    Titles whose primary title contains the search text are ranked as they are found
+    among the candidates, when given, e.g. by the title store. Otherwise, when there
+    are several cores and the search is not scoped, the candidates are found by
+    scanning the titles table in parallel, once. Otherwise rated titles are read
+    using the index of the number of votes, most first, so the search stops as soon
+    as it has found enough titles, and titles whose whole title matches but which
+    are less voted for than those found are only found when the title index exists,
+    or when the search is scoped.
+
+    Each row is (primary_title, year, title_id), with unknown years as 0. When the
+    time budget is exhausted, the search stops early with the titles found so far.
+
+    :param year: if given, only titles from this year, give or take one year, match
+    :param limit: maximum number of titles to yield
+    :param scope: kinds of title to find
+    :param candidates: batches of the titles of the year and scope whose primary
+     title contains the search text, each (primary_title, year, title_id,
+     num_votes), with num_votes None for titles without ratings
+    :raises QueryCancelled: the search was cancelled
+    """
+
+    filter_sql, filter_params = title_filter(year, scope)
+    has_akas = akas_exist()
+    if candidates is None and not scope_applies(scope) and default_search_workers() > 1:
+        candidates = iter_title_candidates(title, budget, year)
+
+    # Each query's last column is the title that matched the search. Queries without
+    # SQL are answered by ranking the candidates.
+    queries = []
+    if candidates is not None:
+        queries.append(("exact_title_search", None, ()))
+    # A scoped search can look up titles using the index of title types and titles
+    elif title_index_exists() or scope_applies(scope):
+        # The index is case sensitive, so look up the usual capitalizations
+        spellings = tuple(dict.fromkeys((title, title.title(), title.capitalize())))
+        placeholders = ", ".join("?" * len(spellings))
+        exact_sql = f"""
+            SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id,
+                t.primary_title
+            FROM titles AS t LEFT JOIN ratings AS r ON r.title_id = t.title_id
+            WHERE t.primary_title IN ({placeholders}) {filter_sql}
+            ORDER BY IFNULL(r.num_votes, 0) DESC LIMIT ?
             """
-            SELECT primary_title, IFNULL(premiered, 0), title_id FROM titles 
-            WHERE primary_title LIKE ?
-            """,
-            (formatted_search,),
+        queries.append(("exact_title_search", exact_sql, spellings + filter_params))
+    # Alternate titles are case insensitive, and are found using their index
+    aka_sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id, a.title
+        FROM akas AS a CROSS JOIN titles AS t ON t.title_id = a.title_id
+        LEFT JOIN ratings AS r ON r.title_id = t.title_id
+        WHERE a.title {{}} {filter_sql}
+        ORDER BY IFNULL(r.num_votes, 0) DESC LIMIT ?
+        """
+    if has_akas:
+        queries.append(
+            ("exact_aka_search", aka_sql.format("= ?"), (title,) + filter_params)
         )
-        rows = c.fetchall()
-        return rows
+    # CROSS JOIN keeps ratings as the outer loop, so titles are read in order of
+    # the number of votes
+    rated_sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id, t.primary_title
+        FROM ratings AS r CROSS JOIN titles AS t ON t.title_id = r.title_id
+        WHERE t.primary_title LIKE ? ESCAPE '\\' {filter_sql}
+        ORDER BY r.num_votes DESC LIMIT ?
+        """
+    unrated_sql = f"""
+        SELECT t.primary_title, IFNULL(t.premiered, 0), t.title_id, t.primary_title
+        FROM {scoped_titles(scope)}
+        WHERE t.primary_title LIKE ? ESCAPE '\\' {filter_sql}
+        AND t.title_id NOT IN (SELECT title_id FROM ratings) LIMIT ?
+        """
+    if candidates is not None:
+        rated_sql = unrated_sql = None
+    like_params = (like_contains(title),) + filter_params
+    queries.append(("ranked_title_search", rated_sql, like_params))
+    if has_akas:
+        queries.append(
+            (
+                "ranked_aka_search",
+                aka_sql.format("LIKE ? ESCAPE '\\'"),
+                (like_prefix(title),) + filter_params,
+            )
+        )
+    queries.append(("unrated_title_search", unrated_sql, like_params))
+
+    found = set()
+    ranked = RankedCandidates(title, limit)
+    folded = title.casefold()
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        try:
+            budget.install(conn)
+            for kind, sql, params in queries:
+                if len(found) == limit or budget.expired():
+                    break
+                if sql is not None:
+                    params += (limit,)
+                    with tracer.trace(kind, conn, sql, params) as trace:
+                        c.execute(sql, params)
+                        rows = c.fetchall()
+                        trace.rows = len(rows)
+                elif kind == "exact_title_search":
+                    for batch in candidates:
+                        ranked.add(batch)
+                    rows = ranked.most_voted(ranked.exact)
+                elif kind == "ranked_title_search":
+                    rows = ranked.most_voted(ranked.rated)
+                else:
+                    rows = ranked.unrated
+                batch = []
+                for row in rows:
+                    if len(found) == limit:
+                        break
+                    if row[2] not in found:
+                        found.add(row[2])
+                        batch.append(row)
+                if batch:
+                    # Sorting is stable, so titles otherwise remain in order of
+                    # popularity
+                    batch.sort(key=lambda row: (row[3] or "").casefold() != folded)
+                    yield [row[:3] for row in batch]
+        except sqlite3.OperationalError as e:
+            if budget.cancelled():
+                raise QueryCancelled(title) from e
+            if not budget.expired():
+                raise
+            logger.warning(
+                "Search for %s stopped after exhausting its time budget of %s seconds",
+                title,
+                budget.time_budget,
+            )
+        finally:
+            # The connection is reused by later queries
+            conn.set_progress_handler(None, 0)
 
 
 def title_index_exists() -> bool:
-    with closing(sqlite3.connect(imdb_db_path())) as conn:
-        c = conn.cursor()
-        c.execute(
+    with read_connection() as conn, closing(conn.cursor()) as c:
+        sql = """
+            SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?;
             """
-            SELECT 1 FROM sqlite_master WHERE type = 'index' AND 
-            name = 'ix_titles_primary_title';
-            """,
-        )
-        row = c.fetchone()
+        params = (TITLE_INDEX,)
+        with tracer.trace("index_exists", conn, sql, params) as trace:
+            c.execute(sql, params)
+            row = c.fetchone()
+            trace.rows = int(row is not None)
         return row is not None
 
 
-def create_title_index(progress_callback: SignalInstance):
+def create_title_index(
+    progress_callback: SignalInstance, cancel_event: threading.Event | None = None
+):
     logger.debug("Creating title_index")
-    with closing(sqlite3.connect(imdb_db_path())) as conn:
-        c = conn.cursor()
-        c.execute(
-            """
-            CREATE INDEX IF NOT EXISTS ix_titles_primary_title 
-            ON titles(primary_title);
-            """,
-        )
+    with closing(sqlite3.connect(imdb_db_path(), isolation_level=None)) as conn:
+        # The largest rowid is a fast and close enough estimate of the row count
+        (total_rows,) = conn.execute(
+            "SELECT IFNULL(MAX(rowid), 0) FROM titles"
+        ).fetchone()
+        progress_callback.emit(("Optimizing database...", 0, total_rows))
+        with tracer.trace("create_index") as trace:
+            build_index(
+                connection=conn,
+                name=TITLE_INDEX,
+                table="titles",
+                column="primary_title",
+                total_rows=total_rows,
+                progress_callback=progress_callback,
+                cancel_event=cancel_event,
+            )
+            trace.rows = total_rows
     logger.debug("title_index created")
+
+
+# Indexes read by warm_up_caches(): the primary key of titles, which every lookup by
+# id reads, and the title index, which searches by title read if it was created
+WARM_UP_INDEXES = ("sqlite_autoindex_titles_1", TITLE_INDEX)
+
+
+def warm_up_indexes(conn: sqlite3.Connection) -> list[tuple[str, str, str]]:
+    """
+    :return: name, table and first column of each of WARM_UP_INDEXES that exists in
+     the database
+    """
+
+    indexes = []
+    for name in WARM_UP_INDEXES:
+        row = conn.execute(
+            "SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = ?",
+            (name,),
+        ).fetchone()
+        if row is None:
+            continue
+        column = conn.execute(f'PRAGMA index_info("{name}")').fetchone()
+        if column is not None and column[2] is not None:
+            indexes.append((name, row[0], column[2]))
+    return indexes
+
+
+def warm_up_caches(
+    progress_callback=None, cancel_event: threading.Event | None = None
+) -> int:
+    """
+    Read what the first lookup or search after startup reads, so that it does not
+    wait on a cold disk cache. Called in a worker thread while the program is idle.
+
+    The primary key of titles and the title index are read once, which brings their
+    pages into the operating system's file cache, where every connection finds them.
+    Other indexes and the tables are not read: they are larger, and most of them only
+    serve rarer queries or full scans that read everything anyway. The memory-mapped
+    indexes are opened, and read ahead by the operating system.
+
+    :return: number of database indexes read, which is fewer than all of them if
+     the warm-up was cancelled
+    """
+
+    budget = QueryBudget(cancel_event=cancel_event)
+    warmed = 0
+    with (
+        tracer.trace("cache_warm_up") as trace,
+        closing(open_read_connection()) as conn,
+    ):
+        budget.install(conn)
+        try:
+            for name, table, column in warm_up_indexes(conn):
+                if budget.cancelled():
+                    break
+                # A covering scan reads every page of the index. COUNT(*) would not
+                # do, because SQLite counts the rows of the smallest index instead.
+                conn.execute(
+                    f'SELECT COUNT("{column}") FROM "{table}" INDEXED BY "{name}"'
+                ).fetchone()
+                warmed += 1
+        except sqlite3.OperationalError:
+            if not budget.cancelled():
+                raise
+        trace.rows = warmed
+
+    if not budget.cancelled():
+        with id_index() as index:
+            if index is not None:
+                index.prefetch()
+        with completion_index() as index:
+            if index is not None:
+                index.prefetch()
+
+    logger.debug(
+        "Warmed up %s database indexes in %.2f seconds%s",
+        warmed,
+        trace.seconds,
+        " before being cancelled" if budget.cancelled() else "",
+    )
+    return warmed
@@ -0,0 +1,150 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Open the dataset for reading, decompressing it with the fastest backend available:
+
+    pigz    pigz -dc, run as a separate process
+    isal    the python-isal module, which uses Intel's ISA-L library
+    zlib    Python's gzip module
+    gzip    gzip -dc, run as a separate process
+
+The pigz and gzip backends decompress in parallel with the thread reading the
+dataset. gzip inflates more slowly than zlib, and the cost of reading its output
+through a pipe outweighs the parallelism, so it is only used when chosen. A file
+that is not gzip compressed is read as is.
+
+Set the environment variable MODEST_MOVIE_METADATA_DECOMPRESSOR to the name of a
+backend to use it rather than the fastest one available.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import subprocess
+from collections.abc import Callable
+from pathlib import Path
+from typing import BinaryIO
+
+try:
+    from isal import igzip_threaded
+except ImportError:
+    igzip_threaded = None
+
+from modestmoviemetadata.tools.logtools import get_logger
+
+logger = get_logger()
+
+decompressor_env_var = "MODEST_MOVIE_METADATA_DECOMPRESSOR"
+
+gzip_magic = b"\x1f\x8b"
+
+# Size of the buffer in which the output of a decompressor process is read
+PIPE_BUFFER_SIZE = 1024 * 1024
+
+
+class DecompressorProcess(io.RawIOBase):
+    """The output of a process that decompresses a file"""
+
+    def __init__(self, command: list[str]) -> None:
+        super().__init__()
+        self.command = command
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Do not open a console window on Windows
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self.process.stdout.readinto(buffer)
+        if not count and self.process.wait() != 0:
+            error = self.process.stderr.read().decode(errors="replace").strip()
+            raise OSError(f"{self.command[0]} failed: {error}")
+        return count
+
+    def close(self) -> None:
+        if not self.closed:
+            # The file may not have been read to its end
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.stdout.close()
+            self.process.stderr.close()
+            self.process.wait()
+        super().close()
+
+
+def open_process(program: str) -> Callable[[Path], BinaryIO]:
+    def open_file(path: Path) -> BinaryIO:
+        command = [shutil.which(program), "-dc", str(path)]
+        return io.BufferedReader(
+            DecompressorProcess(command), buffer_size=PIPE_BUFFER_SIZE
+        )
+
+    return open_file
+
+
+def open_isal(path: Path) -> BinaryIO:
+    # Decompresses in a thread of its own, which does not hold the GIL
+    return igzip_threaded.open(path, "rb", threads=1)
+
+
+def open_zlib(path: Path) -> BinaryIO:
+    return gzip.open(path, "rb")
+
+
+# Backends, fastest first, with a function that returns whether each is available
+backends: dict[str, tuple[Callable[[], bool], Callable[[Path], BinaryIO]]] = {
+    "pigz": (lambda: shutil.which("pigz") is not None, open_process("pigz")),
+    "isal": (lambda: igzip_threaded is not None, open_isal),
+    "zlib": (lambda: True, open_zlib),
+    "gzip": (lambda: shutil.which("gzip") is not None, open_process("gzip")),
+}
+
+
+def available_backends() -> list[str]:
+    return [name for name, (available, _) in backends.items() if available()]
+
+
+def default_backend() -> str:
+    """
+    :return: the backend set in the environment, if it is available, else the
+     fastest available backend
+    """
+
+    name = os.environ.get(decompressor_env_var, "").strip().lower()
+    available = available_backends()
+    if name:
+        if name in available:
+            return name
+        logger.warning("Decompressor %s is not available", name)
+    return available[0]
+
+
+def is_gzip_file(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(gzip_magic)) == gzip_magic
+
+
+def open_dataset(path: Path | str, backend: str | None = None) -> BinaryIO:
+    """
+    Open a dataset for reading in binary mode, decompressing it if it is compressed
+
+    :param path: the dataset, gzip compressed or uncompressed
+    :param backend: name of the backend to decompress with, or None for the default
+    :return: a file object that supports read() and readline()
+    """
+
+    path = Path(path)
+    if not is_gzip_file(path):
+        logger.debug("%s is not compressed", path.name)
+        return open(path, "rb")
+    backend = backend or default_backend()
+    logger.debug("Decompressing %s using %s", path.name, backend)
+    return backends[backend][1](path)
@@ -58,3 +58,15 @@ def imdb_db_path() -> Path:
     path = program_appdata_directory()
     assert path is not None
     return path / "imdb.db"
+
+
+def imdb_index_path() -> Path:
+    path = program_appdata_directory()
+    assert path is not None
+    return path / "imdb.idx"
+
+
+def imdb_completion_path() -> Path:
+    path = program_appdata_directory()
+    assert path is not None
+    return path / "imdb.cmp"
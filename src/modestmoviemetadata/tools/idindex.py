@@ -0,0 +1,247 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Memory-mapped index of IMDb ids, written alongside the database.
+
+Resolving an IMDb id to its title and year is a binary search over a sorted array of
+integer ids, without touching SQLite at all.
+
+File layout, little endian:
+
+header
+    magic, format version, database build id, number of titles
+ids
+    uint32 sorted numeric part of each IMDb id, e.g. 84988 for tt0084988
+offsets
+    uint64 offsets into the records, one more than the number of ids
+records
+    for each title, its year as a uint16 (0 when unknown) followed by its UTF-8
+    encoded primary title
+
+The build id is also stored in the database. An index whose build id does not match
+the database's is ignored.
+"""
+
+import mmap
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from modestmoviemetadata.tools.filetools import imdb_db_path, imdb_index_path
+from modestmoviemetadata.tools.logtools import get_logger
+
+logger = get_logger()
+
+MAGIC = b"MMMIDX\x00\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sI16sQ4x")
+YEAR = struct.Struct("<H")
+
+
+def tconst_to_int(imdb_id: str) -> int | None:
+    if imdb_id.startswith("tt") and imdb_id[2:].isdigit():
+        return int(imdb_id[2:])
+    return None
+
+
+def database_build_id(db_path: Path) -> str | None:
+    # A URI built from the path itself would misread characters such as # and ?
+    uri = f"{db_path.absolute().as_uri()}?mode=ro"
+    try:
+        with closing(sqlite3.connect(uri, uri=True)) as conn:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'build_id'"
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row is not None else None
+
+
+def write_id_index(db_path: Path, index_path: Path, build_id: str) -> int:
+    """
+    Write the IMDb id index for a database.
+
+    :param db_path: database to index
+    :param index_path: index file to create
+    :param build_id: build id of the database, a 32 character hexadecimal string
+    :return: number of titles indexed
+    """
+
+    logger.debug("Writing IMDb id index %s", index_path)
+    ids = array("I")
+    offsets = array("Q", [0])
+    offset = 0
+
+    with tempfile.TemporaryFile(dir=index_path.parent) as records:
+        with closing(sqlite3.connect(db_path)) as conn:
+            c = conn.execute(
+                """
+                SELECT title_id, IFNULL(primary_title, ''), IFNULL(premiered, 0)
+                FROM titles ORDER BY CAST(SUBSTR(title_id, 3) AS INTEGER)
+                """
+            )
+            for title_id, title, year in c:
+                tconst = tconst_to_int(title_id)
+                if tconst is None:
+                    continue
+                record = YEAR.pack(year) + title.encode("utf-8")
+                records.write(record)
+                offset += len(record)
+                ids.append(tconst)
+                offsets.append(offset)
+
+        if sys.byteorder != "little":
+            ids.byteswap()
+            offsets.byteswap()
+
+        with open(index_path, "wb") as f:
+            f.write(
+                HEADER.pack(MAGIC, FORMAT_VERSION, bytes.fromhex(build_id), len(ids))
+            )
+            ids.tofile(f)
+            if len(ids) % 2:
+                # Align the offsets on an 8 byte boundary
+                f.write(b"\x00" * 4)
+            offsets.tofile(f)
+            records.seek(0)
+            shutil.copyfileobj(records, f)
+
+    logger.debug("IMDb id index contains %s titles", len(ids))
+    return len(ids)
+
+
+class IdIndex:
+    """Read-only view of an IMDb id index file"""
+
+    def __init__(self, index_path: Path) -> None:
+        with open(index_path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, build_id, count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError(f"Unrecognized IMDb id index format in {index_path}")
+        self.build_id = build_id.hex()
+
+        view = memoryview(self.mm)
+        ids_start = HEADER.size
+        offsets_start = ids_start + count * 4 + (count % 2) * 4
+        self.records_start = offsets_start + (count + 1) * 8
+        self.ids = view[ids_start : ids_start + count * 4].cast("I")
+        self.offsets = view[offsets_start : self.records_start].cast("Q")
+
+    def lookup(self, imdb_id: str) -> tuple[str, int | None] | None:
+        tconst = tconst_to_int(imdb_id)
+        if tconst is None:
+            return None
+        i = bisect_left(self.ids, tconst)
+        if i == len(self.ids) or self.ids[i] != tconst:
+            return None
+        start = self.records_start + self.offsets[i]
+        end = self.records_start + self.offsets[i + 1]
+        (year,) = YEAR.unpack_from(self.mm, start)
+        title = self.mm[start + YEAR.size : end].decode("utf-8")
+        return title, year or None
+
+    def prefetch(self) -> None:
+        """Ask the operating system to read the index into memory in the background"""
+
+        # Not available on Windows
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self.mm.madvise(mmap.MADV_WILLNEED)
+
+    def close(self) -> None:
+        # Memory views must be released before the memory map can be closed
+        self.ids.release()
+        self.offsets.release()
+        self.mm.close()
+
+
+_lock = threading.Condition()
+_index: IdIndex | None = None
+_loaded = False
+# Number of threads using the index, which must not be closed while they do
+_users = 0
+# Whether id_index_closed() is keeping the index closed
+_closed = False
+
+
+def load_id_index(db_path: Path, index_path: Path) -> IdIndex | None:
+    if sys.byteorder != "little" or not index_path.is_file():
+        return None
+    try:
+        index = IdIndex(index_path)
+    except (OSError, ValueError) as e:
+        logger.warning("Unable to open IMDb id index: %s", e)
+        return None
+    if index.build_id != database_build_id(db_path):
+        logger.warning("Ignoring IMDb id index that does not match the database")
+        index.close()
+        return None
+    logger.debug("Using IMDb id index %s", index_path)
+    return index
+
+
+@contextmanager
+def id_index() -> Iterator[IdIndex | None]:
+    """
+    Yield the IMDb id index for the database, or None if there is no valid index,
+    or while id_index_closed() keeps it closed.
+
+    The index is opened once, and remains open until id_index_closed() closes it,
+    which waits until no thread is using it.
+    """
+
+    global _index, _loaded, _users
+    with _lock:
+        if _closed:
+            index = None
+        else:
+            if not _loaded:
+                _index = load_id_index(imdb_db_path(), imdb_index_path())
+                _loaded = True
+            index = _index
+            if index is not None:
+                _users += 1
+    # The lock is not held while the index is used, so that closing the index does
+    # not wait on a thread that is itself waiting, e.g. on a database connection
+    try:
+        yield index
+    finally:
+        if index is not None:
+            with _lock:
+                _users -= 1
+                _lock.notify_all()
+
+
+@contextmanager
+def id_index_closed() -> Iterator[None]:
+    """
+    Close the IMDb id index, and keep it closed within the context, so that its file
+    can be replaced without a lookup reopening the old file meanwhile. It is
+    reopened when it is next used.
+    """
+
+    global _index, _loaded, _closed
+    with _lock:
+        _closed = True
+        # Lookups are brief, and never wait on anything while using the index
+        _lock.wait_for(lambda: not _users)
+        if _index is not None:
+            _index.close()
+        _index = None
+        _loaded = False
+    try:
+        yield
+    finally:
+        with _lock:
+            _closed = False
@@ -2,25 +2,99 @@
 #  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
-import gzip
+import io
 import os
 import sqlite3
+import threading
+import time
+import uuid
 from collections import OrderedDict
-from contextlib import contextmanager
+from collections.abc import Callable
+from contextlib import AbstractContextManager, closing, contextmanager, nullcontext
+from itertools import islice
 from pathlib import Path
 
 from qtpy.QtCore import QLocale, SignalInstance
 
+from modestmoviemetadata.tools.completionindex import (
+    completion_index_closed,
+    write_completion_index,
+)
+from modestmoviemetadata.tools.decompress import open_dataset
+from modestmoviemetadata.tools.idindex import id_index_closed, write_id_index
 from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.runreport import RunReport
+from modestmoviemetadata.tools.tsvparse import (
+    default_parse_workers,
+    iter_parsed_batches,
+)
+from modestmoviemetadata.tools.utilities import format_bytes
 
 logger = get_logger()
 
+TITLE_INDEX = "ix_titles_primary_title"
+# Index of the title type and title, named as Database.create_indices() names it
+TITLE_TYPE_INDEX = "ix_titles_title_type"
+
+# Approximate number of SQLite virtual machine instructions CREATE INDEX executes per
+# row, used to estimate its progress
+INDEX_INSTRUCTIONS_PER_ROW = 9
+
+# Page size of the compacted database. Title searches scan the whole titles table,
+# and larger pages mean fewer pages to read, with less space lost to page headers
+# and partly filled pages.
+OPTIMIZED_PAGE_SIZE = 8192
+
+
+class ImportCancelled(Exception):
+    """The dataset download or import was cancelled"""
+
+
+# Codes stored in the titles table in place of the dataset's title types, which
+# take a byte each rather than up to a dozen. Codes must not change once assigned,
+# but types may be added. Types without a code are stored as NULL.
+title_type_codes = {
+    "movie": 1,
+    "short": 2,
+    "tvMovie": 3,
+    "tvSpecial": 4,
+    "tvShort": 5,
+    "video": 6,
+    "tvSeries": 7,
+    "tvMiniSeries": 8,
+    "tvEpisode": 9,
+    "tvPilot": 10,
+    "videoGame": 11,
+}
+
+
+def enum_placeholder(codes: dict[str, int]) -> str:
+    """
+    :return: SQL expression that converts the value bound to it to its code
+    """
+
+    cases = " ".join(f"WHEN '{value}' THEN {code}" for value, code in codes.items())
+    return f"CASE ? {cases} END"
+
 
 class Column:
-    """Table column configuration"""
+    """
+    Table column configuration
+
+    index is True to index the column, or a tuple of the names of further columns
+    to index it together with. placeholder is the SQL expression its value is
+    inserted with, by default the value itself.
+    """
 
     def __init__(
-        self, name, type="VARCHAR", pk=None, index=None, unique=None, null=True
+        self,
+        name,
+        type="VARCHAR",
+        pk=None,
+        index=None,
+        unique=None,
+        null=True,
+        placeholder="?",
     ):
         self.name = name
         self.type = type
@@ -28,6 +102,7 @@ class Column:
         self.index = index
         self.unique = unique
         self.null = null
+        self.placeholder = placeholder
 
 
 # Files and their corresponding mapping functions used to import into the
@@ -45,8 +120,19 @@ TSV_TABLE_MAP = OrderedDict(
                     [
                         (
                             "tconst",
+                            # The primary key is indexed, so needs no index of
+                            # its own
+                            Column(name="title_id", type="VARCHAR PRIMARY KEY"),
+                        ),
+                        (
+                            "titleType",
+                            # Indexed with the title, so that searches of some
+                            # types of title read only their part of the index
                             Column(
-                                name="title_id", type="VARCHAR PRIMARY KEY", index=True
+                                name="title_type",
+                                type="INTEGER",
+                                index=("primary_title",),
+                                placeholder=enum_placeholder(title_type_codes),
                             ),
                         ),
                         ("primaryTitle", Column(name="primary_title")),
@@ -55,6 +141,42 @@ TSV_TABLE_MAP = OrderedDict(
                 ),
             ),
         ),
+        (
+            "title.ratings.tsv.gz",
+            (
+                "ratings",
+                OrderedDict(
+                    [
+                        ("tconst", Column(name="title_id", type="VARCHAR PRIMARY KEY")),
+                        ("averageRating", Column(name="average_rating", type="REAL")),
+                        # Indexed so that titles can be read most popular first
+                        (
+                            "numVotes",
+                            Column(name="num_votes", type="INTEGER", index=True),
+                        ),
+                    ]
+                ),
+            ),
+        ),
+        (
+            "title.akas.tsv.gz",
+            (
+                "akas",
+                OrderedDict(
+                    [
+                        ("titleId", Column(name="title_id")),
+                        # Case insensitive, so that searches for titles starting
+                        # with some text can use the index
+                        (
+                            "title",
+                            Column(
+                                name="title", type="VARCHAR COLLATE NOCASE", index=True
+                            ),
+                        ),
+                    ]
+                ),
+            ),
+        ),
     ]
 )
 
@@ -85,6 +207,12 @@ class Database:
             self._create_table_sql(table, mapping.values())
             for table, mapping in self.table_map.values()
         ]
+        # Key value pairs describing the database itself
+        sqls.append(
+            self._create_table_sql(
+                "meta", (Column(name="key", pk=True), Column(name="value"))
+            )
+        )
         sql = "\n".join(sqls)
         logger.debug(sql)
         self.connection.executescript(sql)
@@ -100,8 +228,10 @@ class Database:
             self.connection.executescript(stmt)
         self.commit()
 
-    def analyze(self):
-        self.connection.executescript("ANALYZE;")
+    def set_meta(self, key: str, value: str) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
 
     def begin(self):
         logger.debug("TX BEGIN")
@@ -116,10 +246,16 @@ class Database:
 
     def execute(self, sql, values=None):
         if self.debug_enabled:
-            logger.debug(f"{sql} = {values}")
+            logger.debug("%s = %s", sql, values)
 
         return self.cursor.execute(sql, values)
 
+    def executemany(self, sql, values):
+        if self.debug_enabled:
+            logger.debug("%s = %s", sql, values)
+
+        return self.cursor.executemany(sql, values)
+
     def close(self):
         logger.debug("DB CLOSE")
         self.cursor.close()
@@ -147,11 +283,15 @@ class Database:
 
     @staticmethod
     def _create_index_sql(table_name, columns):
-        lines = [
-            f"CREATE INDEX ix_{table_name}_{c.name} ON {table_name} ({c.name});"
-            for c in columns
-            if c.index
-        ]
+        lines = []
+        for c in columns:
+            if not c.index:
+                continue
+            names = (c.name, *c.index) if isinstance(c.index, tuple) else (c.name,)
+            lines.append(
+                f"CREATE INDEX ix_{table_name}_{c.name} ON {table_name} "
+                f"({', '.join(names)});"
+            )
         return "\n".join(lines)
 
 
@@ -168,88 +308,422 @@ def tsv(f, null="\\N"):
         yield dict(zip(headers, values))
 
 
-def count_lines(f):
-    """Count lines in a byte iterable"""
+def count_lines(f) -> tuple[int, int]:
+    """
+    Count lines in a binary file
+
+    :return: number of lines and number of bytes
+    """
     lf = b"\n"
     chunk_size = 1 << 20
     lines = 0
+    size = 0
     chunk = f.read(chunk_size)
     while chunk:
         lines += chunk.count(lf)
+        size += len(chunk)
         chunk = f.read(chunk_size)
-    return lines
-
-
-def import_file(db, filename, table, column_mapping, progress_callback: SignalInstance):
+    return lines, size
+
+
+def import_file(
+    db,
+    filename,
+    table,
+    column_mapping,
+    progress_callback: SignalInstance,
+    cancel_event: threading.Event | None = None,
+    report: RunReport | None = None,
+    parse_workers: int = 1,
+) -> int:
     """
     Import an imdb file into a given table, using a specific tsv value to column mapping
+
+    Rows are parsed and inserted in batches, so the time spent on each can be
+    reported separately.
+
+    :param parse_workers: number of processes to parse the file with while its rows
+     are inserted. If 1, the file is parsed in this thread.
+    :return: number of rows in the file
     """
 
+    report = report or RunReport()
+    batch_size = 1000
+
     @contextmanager
     def text_open(fn, encoding="utf-8"):
         """Yields utf-8 decoded strings, one per line, from a [gzipped] text file"""
         # Fast python3 text decoding
-        with gzip.open(fn, "rt", encoding=encoding) as tf:
+        with io.TextIOWrapper(open_dataset(fn), encoding=encoding) as tf:
             yield tf
 
     logger.debug("Importing file: %s", filename)
 
     headers = column_mapping.keys()
     columns = [c.name for c in column_mapping.values()]
-    placeholders = ["?" for _ in columns]
+    placeholders = [c.placeholder for c in column_mapping.values()]
     sql = "INSERT INTO {table} ({columns}) VALUES({values})".format(
         table=table, columns=", ".join(columns), values=",".join(placeholders)
     )
 
     logger.debug("Reading number of rows ...")
-    with gzip.open(filename, "rb") as f:
-        total_rows = count_lines(f) - 1  # first line is header
+    with report.span("decompress") as span, open_dataset(filename) as f:
+        total_rows, size = count_lines(f)
+        total_rows -= 1  # first line is header
+        span.bytes += size
+        span.rows += total_rows
 
     locale = QLocale.system()
 
     progress_callback.emit(
         (
-            f"Creating database ({locale.toString(total_rows)} titles)...",
+            f"Creating database ({locale.toString(total_rows)} {table})...",
             0,
             total_rows,
         )
     )
 
+    def iter_batches():
+        with text_open(filename) as tf:
+            rows = tsv(tf)
+            while batch := [
+                [row[h] for h in headers if h in row]
+                for row in islice(rows, batch_size)
+            ]:
+                yield batch
+
+    if parse_workers > 1:
+        logger.debug("Parsing using %s processes", parse_workers)
+        batches = iter_parsed_batches(filename, list(headers), parse_workers)
+    else:
+        batches = iter_batches()
+
     logger.debug("Inserting %s rows into table: %s", total_rows, table)
     db.begin()
     try:
-        with text_open(filename) as tf:
-            for count, row in enumerate(tsv(tf)):
-                values = [row[h] for h in headers if h in row]
-                db.execute(sql, list(values))
-                if count % 1000 == 0:
-                    progress_callback.emit(("", count, -1))
+        with closing(batches):
+            count = 0
+            while True:
+                # When parsing using processes, the time spent waiting for them
+                start = time.perf_counter()
+                batch = next(batches, [])
+                parsed = time.perf_counter()
+                report.add("parse", parsed - start, rows=len(batch))
+                if not batch:
+                    break
+                db.executemany(sql, batch)
+                report.add("insert", time.perf_counter() - parsed, rows=len(batch))
+                count += len(batch)
+                progress_callback.emit(("", count, -1))
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ImportCancelled(filename)
         db.commit()
     except Exception:
         db.rollback()
         raise
+    for name in ("parse", "insert"):
+        if name in report.spans:
+            logger.info("%s", report.spans[name])
+    return total_rows
+
+
+def normalize_akas(db: Database) -> int:
+    """
+    Reduce the imported alternate titles to the distinct titles of each title that
+    differ from its primary title. The dataset lists the same title once per region
+    and language it is used in.
+
+    :return: number of alternate titles kept
+    """
+
+    table, column_mapping = TSV_TABLE_MAP["title.akas.tsv.gz"]
+    db.connection.executescript(
+        f"""
+        ALTER TABLE {table} RENAME TO {table}_imported;
+        {db._create_table_sql(table, column_mapping.values())}
+        INSERT INTO {table} (title_id, title)
+            SELECT DISTINCT a.title_id, a.title
+            FROM {table}_imported AS a JOIN titles AS t ON t.title_id = a.title_id
+            WHERE a.title IS NOT NULL AND a.title != t.primary_title;
+        DROP TABLE {table}_imported;
+        """
+    )
+    (count,) = db.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    return count
+
+
+def build_index(
+    connection: sqlite3.Connection,
+    name: str,
+    table: str,
+    column: str,
+    total_rows: int,
+    progress_callback: SignalInstance,
+    cancel_event: threading.Event | None = None,
+) -> None:
+    """
+    Create an index on a populated table, reporting progress and allowing the build to
+    be cancelled.
+
+    Creating the index after the table has been bulk loaded lets SQLite build it
+    with an external merge sort of the column's values, rather than updating the
+    index one row at a time as the rows are inserted.
+
+    :param total_rows: number of rows in the table, used to estimate progress
+    """
+
+    granularity = 1000
+    ticks = 0
+
+    def progress_handler() -> int:
+        nonlocal ticks
+        ticks += 1
+        if cancel_event is not None and cancel_event.is_set():
+            # A non-zero return value interrupts the build
+            return 1
+        if ticks % 100 == 0:
+            rows = ticks * granularity // INDEX_INSTRUCTIONS_PER_ROW
+            progress_callback.emit(("", min(rows, total_rows), -1))
+        return 0
+
+    logger.debug("Creating index %s", name)
+    connection.set_progress_handler(progress_handler, granularity)
+    try:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column});")
+    except sqlite3.OperationalError as e:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ImportCancelled(name) from e
+        raise
+    finally:
+        connection.set_progress_handler(None, 0)
+    logger.debug("Index %s created", name)
+
 
+def space_usage(connection: sqlite3.Connection) -> dict[str, int]:
+    """
+    :return: bytes used by each table and index, largest first, or an empty dict if
+     this build of SQLite lacks the dbstat virtual table
+    """
+
+    try:
+        rows = connection.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC"
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        logger.debug("Space usage is not available: %s", e)
+        return {}
+    return dict(rows)
+
+
+def optimize_db(
+    path: Path,
+    cancel_event: threading.Event | None = None,
+    report: RunReport | None = None,
+    page_size: int = OPTIMIZED_PAGE_SIZE,
+) -> None:
+    """
+    Analyze the newly imported database for the query planner, and then replace it
+    with a compacted copy, with rows stored in order and pages fully used
 
-def create_db(dataset: Path, progress_callback: SignalInstance):
+    :param path: path of the database, which must not be open, so that it can be
+     replaced
+    :param page_size: page size of the compacted copy
+    """
+
+    report = report or RunReport()
+    compact_path = path.with_name(f"{path.name}.compact")
+    compact_path.unlink(missing_ok=True)
+
+    with closing(sqlite3.connect(path, isolation_level=None)) as conn:
+        with report.span("analyze"):
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+
+        if cancel_event is not None:
+            conn.set_progress_handler(lambda: int(cancel_event.is_set()), 10_000)
+        try:
+            with report.span("vacuum") as span:
+                span.bytes = path.stat().st_size
+                # Takes effect in the copy written by VACUUM INTO
+                conn.execute(f"PRAGMA page_size = {int(page_size)}")
+                conn.execute("VACUUM INTO ?", (str(compact_path),))
+        except sqlite3.OperationalError:
+            compact_path.unlink(missing_ok=True)
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled(str(path)) from None
+            raise
+
+    # The database is closed, otherwise on Windows it could not be replaced
+    before = path.stat().st_size
+    after = compact_path.stat().st_size
+    os.replace(compact_path, path)
+    logger.info(
+        "Compacted database from %s to %s",
+        format_bytes(before),
+        format_bytes(after),
+    )
+    report.info["database_size"] = after
+
+    with closing(sqlite3.connect(path)) as conn:
+        space = space_usage(conn)
+    for name, size in space.items():
+        logger.info("%s: %s", name, format_bytes(size))
+    report.space = space
+
+
+def create_db(
+    dataset: Path,
+    progress_callback: SignalInstance,
+    id_index: bool = True,
+    title_index: bool = False,
+    cancel_event: threading.Event | None = None,
+    report: RunReport | None = None,
+    optimize: bool = True,
+    dataset_digest: str = "",
+    parse_workers: int | None = None,
+    replacing: Callable[[], AbstractContextManager] | None = None,
+):
+    """
+    Convert the dataset into the database.
+
+    The database and its IMDb id and completion indices are built under temporary
+    names, and replace the existing database and indices only once they are
+    complete. The dataset is
+    deleted once the conversion succeeds.
+
+    The titles are read from the dataset. The other files in TSV_TABLE_MAP are read
+    from the dataset's directory, and are skipped if they are missing.
+
+    :param dataset: downloaded IMDb dataset of titles
+    :param progress_callback: progress signal
+    :param id_index: whether to write the memory-mapped IMDb id and completion
+     indices
+    :param title_index: whether to create the index used when searching by title
+    :param cancel_event: when set, the conversion is cancelled
+    :param report: report in which to record the time each stage takes
+    :param optimize: whether to analyze and compact the database
+    :param dataset_digest: digest of the dataset's content, recorded in the database
+     so that an unchanged dataset need not be converted again
+    :param parse_workers: number of processes to parse the dataset with, or None to
+     choose according to the number of CPU cores
+    :param replacing: returns a context within which the existing database is
+     replaced, e.g. one that keeps connections to it closed
+    """
+
+    report = report or RunReport()
+    if parse_workers is None:
+        parse_workers = default_parse_workers()
     progress_callback.emit(("Examining dataset...", 0, 0))
     uri = dataset.parent / "imdb.db"
-    if uri.exists():
-        uri.unlink()
-    logger.debug("Creating database: %s", uri)
+    index_uri = dataset.parent / "imdb.idx"
+    completion_uri = dataset.parent / "imdb.cmp"
+    new_uri = uri.with_name(f"{uri.name}.new")
+    new_index_uri = index_uri.with_name(f"{index_uri.name}.new")
+    new_completion_uri = completion_uri.with_name(f"{completion_uri.name}.new")
+    for path in (new_uri, new_index_uri, new_completion_uri):
+        if path.exists():
+            path.unlink()
+    logger.debug("Creating database: %s", new_uri)
     table_map = TSV_TABLE_MAP
-    db = Database(table_map=table_map, uri=str(uri))
-    for filename, table_mapping in table_map.items():
-        table, column_mapping = table_mapping
-        logger.debug("Table: %s", table)
-        import_file(
-            db=db,
-            filename=str(dataset),
-            table=table,
-            column_mapping=column_mapping,
-            progress_callback=progress_callback,
-        )
+    sources = {filename: dataset.with_name(filename) for filename in table_map}
+    sources[next(iter(table_map))] = dataset
+    db = Database(table_map=table_map, uri=str(new_uri))
+    try:
+        try:
+            total_rows = 0
+            for filename, (table, column_mapping) in table_map.items():
+                source = sources[filename]
+                if not source.exists():
+                    logger.warning("Not importing missing dataset %s", source.name)
+                    continue
+                logger.debug("Table: %s", table)
+                rows = import_file(
+                    db=db,
+                    filename=str(source),
+                    table=table,
+                    column_mapping=column_mapping,
+                    progress_callback=progress_callback,
+                    cancel_event=cancel_event,
+                    report=report,
+                    parse_workers=parse_workers,
+                )
+                if table == "titles":
+                    total_rows = rows
+                elif table == "akas":
+                    progress_callback.emit(("Optimizing alternate titles...", 0, 0))
+                    with report.span("akas_normalize") as span:
+                        span.rows = normalize_akas(db)
+            logger.debug("Creating database index ...")
+            progress_callback.emit(("Optimizing database...", 0, 0))
+            with report.span("index_build") as span:
+                db.create_indices()
+                if title_index:
+                    progress_callback.emit(
+                        ("Optimizing database for title searches...", 0, total_rows)
+                    )
+                    build_index(
+                        connection=db.connection,
+                        name=TITLE_INDEX,
+                        table="titles",
+                        column="primary_title",
+                        total_rows=total_rows,
+                        progress_callback=progress_callback,
+                        cancel_event=cancel_event,
+                    )
+                span.rows = total_rows
+            build_id = uuid.uuid4().hex
+            db.set_meta("build_id", build_id)
+            if dataset_digest:
+                db.set_meta("dataset_digest", dataset_digest)
+        finally:
+            db.close()
+        if optimize:
+            progress_callback.emit(("Compacting database...", 0, 0))
+            optimize_db(new_uri, cancel_event, report)
+
+        if id_index:
+            progress_callback.emit(("Indexing IMDb ids...", 0, 0))
+            with report.span("id_index") as span:
+                span.rows = write_id_index(
+                    db_path=new_uri, index_path=new_index_uri, build_id=build_id
+                )
+                span.bytes = new_index_uri.stat().st_size
+            progress_callback.emit(("Indexing titles for completion...", 0, 0))
+            with report.span("completion_index") as span:
+                span.rows = write_completion_index(
+                    db_path=new_uri,
+                    index_path=new_completion_uri,
+                    build_id=build_id,
+                    excluded_types=(title_type_codes["tvEpisode"],),
+                )
+                span.bytes = new_completion_uri.stat().st_size
+    except Exception:
+        for path in (new_uri, new_index_uri, new_completion_uri):
+            path.unlink(missing_ok=True)
+        raise
+
+    # Close the database's connections first: a query using one may be about to use
+    # an index. Then release the old indices' memory maps, otherwise they cannot be
+    # replaced, and keep them closed until every file is replaced, so that a lookup
+    # meanwhile neither reopens an old index nor finds a new index's database missing
+    with (
+        replacing() if replacing is not None else nullcontext(),
+        id_index_closed(),
+        completion_index_closed(),
+    ):
+        logger.debug("Replacing database: %s", uri)
+        os.replace(new_uri, uri)
+        for new_path, path in (
+            (new_index_uri, index_uri),
+            (new_completion_uri, completion_uri),
+        ):
+            if id_index:
+                os.replace(new_path, path)
+            elif path.exists():
+                path.unlink()
     logger.debug("Deleting dataset")
-    dataset.unlink()
-    logger.debug("Creating database index ...")
-    progress_callback.emit(("Optimizing database...", 0, 0))
-    db.create_indices()
+    with report.span("dataset_cleanup") as span:
+        for source in sources.values():
+            if source.exists():
+                span.bytes += source.stat().st_size
+                source.unlink()
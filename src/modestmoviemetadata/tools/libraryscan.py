@@ -0,0 +1,339 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Scan a media library for folders whose names lack an IMDb id, and propose Jellyfin
+folder names for them, for review before the folders are renamed.
+
+    modestmoviemetadata-scan D:\\Movies -o proposals.csv
+
+Folder names like "The Matrix (1999)", "The.Matrix.1999.1080p.BluRay" and
+"The Matrix" are parsed into a title and year. All titles are then matched against
+the database at once, with the titles table divided into ranges of rows that are
+scanned in parallel. Titles that match no primary title are then looked up in the
+alternate titles, e.g. titles used in other countries, and are proposed under
+their primary title.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from modestmoviemetadata.tools.database import (
+    akas_exist,
+    open_read_connection,
+    read_connection,
+    rowid_partitions,
+)
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.movieinfo import (
+    FOLDER_NAME_INVALID_CHARACTERS,
+    jellyfin_folder_name,
+    sanitise_title,
+)
+from modestmoviemetadata.tools.querytrace import tracer
+
+logger = get_logger()
+
+imdb_suffix_pattern = re.compile(r"\[imdbid-tt\d+\]", re.IGNORECASE)
+# A plausible year, preceded by a separator so that a title that starts with a
+# year, e.g. "1917 (2019)", is not mistaken for one
+year_pattern = re.compile(r"[\s(\[]((?:18|19|20)\d{2})(?=[\s)\]]|$)")
+release_separator_pattern = re.compile(r"[._]+")
+
+# Number of partitions of the titles table per worker thread, so that workers that
+# finish early can help with the remaining partitions
+PARTITIONS_PER_WORKER = 4
+
+
+@dataclass(slots=True)
+class FolderProposal:
+    path: str
+    title: str
+    year: int | None
+    status: str = "not_found"
+    imdb_id: str = ""
+    proposed_name: str = ""
+    candidates: list[str] = field(default_factory=list)
+
+
+def parse_folder_name(name: str) -> tuple[str, int | None] | None:
+    """
+    :return: title and year parsed from the folder name, or None if it has no title
+    """
+
+    if " " not in name:
+        name = release_separator_pattern.sub(" ", name)
+    matches = list(year_pattern.finditer(name))
+    if matches:
+        # The last year, e.g. in "Blade Runner 2049 (2017)"
+        match = matches[-1]
+        title = name[: match.start()]
+        year = int(match.group(1))
+    else:
+        title = name
+        year = None
+    title = title.strip(" -([")
+    if not title:
+        return None
+    return title, year
+
+
+def folder_key(title: str) -> str:
+    """
+    :return: title normalized for matching, in the same way as folder_key_sql()
+    """
+
+    # SQLite's lower() only converts ASCII characters
+    return "".join(c.lower() if c.isascii() else c for c in sanitise_title(title))
+
+
+def folder_key_sql(column: str) -> str:
+    expression = column
+    for c in FOLDER_NAME_INVALID_CHARACTERS:
+        expression = f"replace({expression}, '{c}', '')"
+    return f"lower({expression})"
+
+
+def iter_folders(root: Path) -> Iterator[tuple[Path, str, int | None]]:
+    """
+    Yield folders under the root that lack an IMDb id, with their parsed title and
+    year.
+
+    A folder whose name has a year is taken to be a title's folder, and its
+    subfolders, e.g. extras, are not scanned. Other folders are scanned, and are
+    taken to be a title's folder only if they have no subfolders.
+    """
+
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = [
+                    entry
+                    for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
+                    and not entry.name.startswith(".")
+                ]
+        except OSError as e:
+            logger.warning("Unable to scan %s: %s", directory, e)
+            continue
+
+        if directory != root and not subdirectories:
+            parsed = parse_folder_name(directory.name)
+            if parsed is not None and parsed[1] is None:
+                yield directory, *parsed
+
+        for entry in subdirectories:
+            if imdb_suffix_pattern.search(entry.name):
+                continue
+            parsed = parse_folder_name(entry.name)
+            if parsed is not None and parsed[1] is not None:
+                yield Path(entry.path), *parsed
+            else:
+                stack.append(Path(entry.path))
+
+
+def match_partition(
+    keys: list[str], first: int, last: int
+) -> list[tuple[str, str, int, str]]:
+    """
+    :return: key, title, year and IMDb id of each title in the range of rows whose
+     key is one of the keys
+    """
+
+    with closing(open_read_connection()) as conn:
+        conn.execute("CREATE TEMP TABLE wanted (key TEXT PRIMARY KEY)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO wanted VALUES (?)", ((key,) for key in keys)
+        )
+        # CROSS JOIN keeps titles as the outer loop, so each row is matched using
+        # the index of the wanted keys
+        sql = f"""
+            SELECT w.key, t.primary_title, IFNULL(t.premiered, 0), t.title_id
+            FROM titles AS t CROSS JOIN wanted AS w
+            ON w.key = {folder_key_sql("t.primary_title")}
+            WHERE t.rowid BETWEEN ? AND ?
+            """
+        params = (first, last)
+        with tracer.trace("library_match", conn, sql, params) as trace:
+            rows = conn.execute(sql, params).fetchall()
+            trace.rows = len(rows)
+        return rows
+
+
+def match_akas(keys: list[str]) -> list[tuple[str, str, int, str]]:
+    """
+    :return: key, primary title, year and IMDb id of each title with an alternate
+     title that is one of the keys
+    """
+
+    with closing(open_read_connection()) as conn:
+        conn.execute("CREATE TEMP TABLE wanted (key TEXT PRIMARY KEY)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO wanted VALUES (?)", ((key,) for key in keys)
+        )
+        # The alternate titles are compared case insensitively, so each key is
+        # looked up using their index. Unlike primary titles, alternate titles
+        # containing characters not allowed in folder names do not match.
+        sql = """
+            SELECT DISTINCT w.key, t.primary_title, IFNULL(t.premiered, 0), t.title_id
+            FROM wanted AS w CROSS JOIN akas AS a ON a.title = w.key
+            CROSS JOIN titles AS t ON t.title_id = a.title_id
+            """
+        with tracer.trace("library_aka_match", conn, sql) as trace:
+            rows = conn.execute(sql).fetchall()
+            trace.rows = len(rows)
+        return rows
+
+
+def match_titles(
+    keys: list[str], workers: int
+) -> dict[str, list[tuple[str, int, str]]]:
+    """
+    :return: title, year and IMDb id of the titles matching each key
+    """
+
+    with read_connection() as conn:
+        partitions = rowid_partitions(conn, workers * PARTITIONS_PER_WORKER)
+
+    matches = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(match_partition, keys, first, last)
+            for first, last in partitions
+        ]
+        for future in futures:
+            for key, title, year, imdb_id in future.result():
+                matches[key].append((title, year, imdb_id))
+
+    unmatched = [key for key in keys if key not in matches]
+    if unmatched and akas_exist():
+        for key, title, year, imdb_id in match_akas(unmatched):
+            matches[key].append((title, year, imdb_id))
+    return matches
+
+
+def choose_title(
+    proposal: FolderProposal, candidates: list[tuple[str, int, str]]
+) -> None:
+    if proposal.year is not None:
+        exact = [c for c in candidates if c[1] == proposal.year]
+        near = [c for c in candidates if abs(c[1] - proposal.year) <= 1]
+        candidates = exact or near
+    proposal.candidates = [imdb_id for _, _, imdb_id in candidates]
+    if len(candidates) == 1:
+        title, year, imdb_id = candidates[0]
+        proposal.status = "matched"
+        proposal.imdb_id = imdb_id
+        if year:
+            proposal.proposed_name = jellyfin_folder_name(title, year, imdb_id)
+    elif candidates:
+        proposal.status = "ambiguous"
+
+
+def scan_library(root: Path, workers: int | None = None) -> list[FolderProposal]:
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    proposals = [
+        FolderProposal(path=str(path), title=title, year=year)
+        for path, title, year in iter_folders(root)
+    ]
+    logger.info(
+        "Found %s folders without an IMDb id in %.2f seconds",
+        len(proposals),
+        time.perf_counter() - start,
+    )
+    if not proposals:
+        return proposals
+
+    start = time.perf_counter()
+    keys = [folder_key(proposal.title) for proposal in proposals]
+    matches = match_titles(sorted(set(keys)), workers)
+    for proposal, key in zip(proposals, keys, strict=True):
+        choose_title(proposal, matches.get(key, []))
+    logger.info(
+        "Matched folders against the database in %.2f seconds using %s workers",
+        time.perf_counter() - start,
+        workers,
+    )
+    return proposals
+
+
+def write_csv(proposals: list[FolderProposal], output) -> None:
+    fieldnames = [f for f in FolderProposal.__dataclass_fields__]
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    for proposal in proposals:
+        row = asdict(proposal)
+        row["candidates"] = " ".join(proposal.candidates)
+        writer.writerow(row)
+
+
+def write_json(proposals: list[FolderProposal], output) -> None:
+    json.dump([asdict(proposal) for proposal in proposals], output, indent=2)
+    output.write("\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Propose Jellyfin folder names for folders that lack an IMDb id"
+    )
+    parser.add_argument("root", type=Path, help="media library folder to scan")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="file to write, instead of standard output"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=("csv", "json"),
+        help="output format; by default determined by the output file's extension",
+    )
+    parser.add_argument("-w", "--workers", type=int, help="number of worker threads")
+    args = parser.parse_args()
+
+    if not args.root.is_dir():
+        parser.error(f"{args.root} is not a folder")
+    output_format = args.format or (
+        "json" if args.output and args.output.suffix.lower() == ".json" else "csv"
+    )
+
+    try:
+        proposals = scan_library(args.root, args.workers)
+    except sqlite3.Error as e:
+        print(f"Unable to read the database: {e}", file=sys.stderr)
+        return 1
+
+    write = write_json if output_format == "json" else write_csv
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            write(proposals, f)
+    else:
+        write(proposals, sys.stdout)
+
+    counts = defaultdict(int)
+    for proposal in proposals:
+        counts[proposal.status] += 1
+    print(
+        f"{len(proposals)} folders: {counts['matched']} matched, "
+        f"{counts['ambiguous']} ambiguous, {counts['not_found']} not found",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
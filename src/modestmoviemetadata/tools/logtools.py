@@ -1,11 +1,14 @@
 #  SPDX-FileCopyrightText: 2022-2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
+import atexit
+import copy
 import gzip
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 try:
@@ -25,11 +28,24 @@ log_colors = {
     "CRITICAL": "red,bg_white",
 }
 
+# Sets the logging level, e.g. DEBUG. Otherwise the level passed to
+# setup_main_process_logging() is used.
+log_level_env_var = "MODEST_MOVIE_METADATA_LOG_LEVEL"
+
+# Writes log records to the log file and console in a background thread, so that
+# threads that log, e.g. the GUI thread, never wait on file I/O or log rotation
+_queue_listener: QueueListener | None = None
+
 logging_date_format = "%Y-%m-%d %H:%M:%S"
 file_logging_format = "%(asctime)s %(levelname)s %(filename)s %(lineno)d: %(message)s"
 
 
 class RotatingGzipFileHandler(RotatingFileHandler):
+    """
+    Rotate log files, compressing old ones. Rotation is done by the thread that
+    emits the record, which is the queue listener's thread.
+    """
+
     def rotation_filename(self, name):
         return name + ".gz"
 
@@ -39,6 +55,28 @@ class RotatingGzipFileHandler(RotatingFileHandler):
         os.remove(source)
 
 
+class DeferredFormattingQueueHandler(QueueHandler):
+    """
+    Queue log records unformatted, so that their message is formatted by the queue
+    listener's handlers in its thread, rather than by the thread that logs them.
+
+    The record's arguments are kept as they are. Only an exception's traceback is
+    rendered to text here, because its frames do not outlive the exception handler.
+    """
+
+    exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.exception_formatter.formatException(
+                    record.exc_info
+                )
+            record.exc_info = None
+        return record
+
+
 def get_program_logging_directory(appdata_dir: Path) -> Path | None:
     """
     Get directory in which to store program log files.
@@ -76,30 +114,56 @@ def full_log_file_path(appdata_path: Path, alternate_path: Path) -> Path:
     return log_file
 
 
+def logging_level_from_environment(default: int) -> int:
+    """
+    :return: the logging level set in the environment, or the default if it is not
+     set or is not a valid level
+    """
+
+    name = os.environ.get(log_level_env_var, "").strip().upper()
+    if not name:
+        return default
+    level = logging.getLevelName(name)
+    if not isinstance(level, int):
+        logging.warning("Ignoring invalid logging level %s", name)
+        return default
+    return level
+
+
 def setup_main_process_logging(
     appdata_path: Path, alternate_path: Path, logging_level: int
 ) -> logging.Logger:
     """
     Setup logging at the module level.
 
+    Records are put on a queue, and formatted and written to the log file and
+    console by a background thread. Records below the logging level are discarded by the
+    logger before they are formatted.
+
     :param appdata_path: primary program configuration directory
     :param alternate_path: alternate program configuration directory if primary fails
-    :param logging_level: logging module's logging level for console output
+    :param logging_level: logging module's logging level, unless overridden by the
+     environment
     :return: default logging object
     """
 
-    log_file = full_log_file_path(appdata_path, alternate_path)
+    global _queue_listener
+
     logger = get_logger()
+    if _queue_listener is not None:
+        return logger
+
+    logging_level = logging_level_from_environment(logging_level)
+
+    log_file = full_log_file_path(appdata_path, alternate_path)
     max_bytes = 1024 * 1024  # 1 MB
     filehandler = RotatingGzipFileHandler(
         str(log_file), maxBytes=max_bytes, backupCount=10, encoding="utf-8"
     )
-    filehandler.setLevel(logging.DEBUG)
+    filehandler.setLevel(logging_level)
     filehandler.setFormatter(
         logging.Formatter(file_logging_format, logging_date_format)
     )
-    logger.addHandler(filehandler)
-    logger.setLevel(logging.DEBUG)
 
     consolehandler = logging.StreamHandler()
     consolehandler.set_name("console")
@@ -110,9 +174,29 @@ def setup_main_process_logging(
     else:
         consolehandler.setFormatter(logging.Formatter(logging_format))
     consolehandler.setLevel(logging_level)
-    logger.addHandler(consolehandler)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredFormattingQueueHandler(log_queue))
+    logger.setLevel(logging_level)
+    _queue_listener = QueueListener(
+        log_queue, filehandler, consolehandler, respect_handler_level=True
+    )
+    _queue_listener.start()
+    atexit.register(stop_logging)
     return logger
 
 
+def stop_logging() -> None:
+    """
+    Write any queued log records, and stop the background logging thread
+    """
+
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
 def get_logger() -> logging.Logger:
     return logging.getLogger(application_name)
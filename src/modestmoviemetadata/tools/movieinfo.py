@@ -2,13 +2,47 @@
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
 import re
-from collections.abc import Callable
+import threading
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
+from itertools import islice
 
-from modestmoviemetadata.tools.database import query_by_imdb_id, query_by_title
+from qtpy.QtCore import SignalInstance
 
+from modestmoviemetadata.tools.database import (
+    RANKED_SEARCH_LIMIT,
+    QueryBudget,
+    TitleScope,
+    akas_exist,
+    default_search_workers,
+    iter_partitioned_query_by_title,
+    iter_query_by_aka,
+    iter_query_by_title,
+    iter_query_ranked_by_title,
+    query_by_imdb_id,
+    query_by_imdb_ids,
+    query_votes_by_imdb_ids,
+    ratings_exist,
+    scope_applies,
+)
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.titlestore import TitleStore, title_store
 
-@dataclass
+logger = get_logger()
+
+imdb_id_pattern = re.compile(r"tt\d+")
+
+# Only this many characters of text are scanned for IMDb ids, so that a huge
+# clipboard, e.g. a copied log file or web page, is not slow to scan
+IMDB_ID_SCAN_LIMIT = 64 * 1024
+# Maximum number of distinct IMDb ids extracted from text
+IMDB_ID_MAX_COUNT = 100
+# Maximum number of titles fetch_movie_info() finds by searching, e.g. for every
+# title of a year
+FETCH_SEARCH_LIMIT = 1000
+
+
+@dataclass(slots=True)
 class MovieInfo:
     title: str
     year: int | None
@@ -16,18 +50,164 @@ class MovieInfo:
 
 
 def get_imdb(text: str) -> str:
-    match = re.search(r"(?P<id>tt\d+)", text)
+    match = imdb_id_pattern.search(text)
     if match is not None:
-        return match.group("id")
+        return match.group()
     return ""
 
 
+def get_imdb_ids(text: str) -> list[str]:
+    """
+    :return: the distinct IMDb ids in the text, in the order they first appear
+    """
+
+    imdb_ids: dict[str, None] = {}
+    for match in imdb_id_pattern.finditer(text, 0, IMDB_ID_SCAN_LIMIT):
+        if match.end() == IMDB_ID_SCAN_LIMIT < len(text):
+            # The IMDb id may be truncated
+            break
+        imdb_ids[match.group()] = None
+        if len(imdb_ids) == IMDB_ID_MAX_COUNT:
+            break
+    return list(imdb_ids)
+
+
+def iter_movie_info(
+    title: str,
+    year: int | None,
+    budget: QueryBudget,
+    scope: TitleScope = TitleScope.ALL,
+) -> Iterator[list[MovieInfo]]:
+    """
+    Yield batches of titles matching the search, materialized straight from the
+    database cursor, so only one batch of rows is held at a time. If the title store
+    is loaded, it is searched instead of the database. An unscoped search of the
+    database scans the titles table in parallel when there are several cores.
+
+    Titles whose primary title matches are followed by titles with an alternate
+    title that starts with the search text.
+    """
+
+    def row_factory(cursor, row) -> MovieInfo:
+        return MovieInfo(*row)
+
+    store = title_store()
+    if store is not None:
+        for batch in store.search(title, budget, year=year, scope=scope):
+            imdb_ids = [f"tt{tconst:07d}" for tconst, _ in batch]
+            rows = query_by_imdb_ids(imdb_ids)
+            yield [
+                MovieInfo(rows[imdb_id][0], title_year, imdb_id)
+                for imdb_id, (_, title_year) in zip(imdb_ids, batch, strict=True)
+                if imdb_id in rows
+            ]
+    elif scope_applies(scope) or default_search_workers() == 1:
+        yield from iter_query_by_title(title, budget, year, row_factory, scope=scope)
+    else:
+        yield from iter_partitioned_query_by_title(title, budget, year, row_factory)
+
+    if akas_exist() and not budget.expired():
+        yield from iter_query_by_aka(title, budget, year, row_factory, scope=scope)
+
+
+def iter_store_candidates(
+    store: TitleStore,
+    title: str,
+    year: int | None,
+    budget: QueryBudget,
+    scope: TitleScope = TitleScope.ALL,
+) -> Iterator[list[tuple]]:
+    """
+    Yield batches of the titles the title store finds, with their number of votes,
+    as candidates for iter_query_ranked_by_title() to rank
+    """
+
+    for batch in store.search(title, budget, year=year, scope=scope):
+        imdb_ids = [f"tt{tconst:07d}" for tconst, _ in batch]
+        rows = query_by_imdb_ids(imdb_ids)
+        votes = query_votes_by_imdb_ids(imdb_ids)
+        yield [
+            (rows[imdb_id][0], title_year, imdb_id, votes.get(imdb_id))
+            for imdb_id, (_, title_year) in zip(imdb_ids, batch, strict=True)
+            if imdb_id in rows
+        ]
+
+
+def iter_ranked_movie_info(
+    title: str,
+    year: int | None,
+    budget: QueryBudget,
+    limit: int = RANKED_SEARCH_LIMIT,
+    scope: TitleScope = TitleScope.ALL,
+) -> Iterator[list[MovieInfo]]:
+    """
+    Yield batches of the titles matching the search that the user most likely wants,
+    best first. If the title store is loaded, the titles it finds are ranked, rather
+    than searching the titles table.
+    """
+
+    store = title_store()
+    candidates = (
+        None
+        if store is None
+        else iter_store_candidates(store, title, year, budget, scope)
+    )
+    for rows in iter_query_ranked_by_title(
+        title, budget, year, limit, scope, candidates
+    ):
+        yield [MovieInfo(*row) for row in rows]
+
+
+def ranked_movie_info(
+    title: str,
+    year: int | None,
+    budget: QueryBudget,
+    limit: int = RANKED_SEARCH_LIMIT,
+    scope: TitleScope = TitleScope.ALL,
+) -> list[MovieInfo] | None:
+    """
+    :return: the titles matching the search that the user most likely wants, best
+     first, or None if the database has no ratings with which to rank them
+    """
+
+    if not ratings_exist():
+        return None
+    return [
+        movie
+        for movies in iter_ranked_movie_info(title, year, budget, limit, scope)
+        for movie in movies
+    ]
+
+
+def title_search_needs_title_index(scope: TitleScope = TitleScope.ALL) -> bool:
+    """
+    :param scope: kinds of title the search finds
+    :return: whether a search by title reads the title index, if it exists, i.e.
+     whether it is ranked, and neither searches the title store, nor is scoped, nor
+     scans the titles table in parallel
+    """
+
+    return (
+        title_store() is None
+        and ratings_exist()
+        and not scope_applies(scope)
+        and default_search_workers() == 1
+    )
+
+
 def fetch_movie_info(
     title: str,
     year: int | None,
     imdb_id: str,
     progress_callback: Callable[[int], None],
-) -> list[MovieInfo] | None:
+    scope: TitleScope = TitleScope.ALL,
+) -> list[MovieInfo]:
+    """
+    Look up a title using either its IMDb id, or its title and (optionally) year.
+    A search by title finds at most FETCH_SEARCH_LIMIT titles, and none if it fails.
+
+    :param scope: kinds of title a search by title finds
+    """
 
     if imdb_id:
         data = query_by_imdb_id(imdb_id)
@@ -40,26 +220,91 @@ def fetch_movie_info(
             return [MovieInfo(title="", year=None, imdb_id=imdb_id)]
 
     else:
+        movies = (
+            movie
+            for batch in iter_movie_info(title, year, QueryBudget(), scope)
+            for movie in batch
+        )
         try:
-            movies = query_by_title(title)
-        except Exception as inst:
-            ic(inst)
-        else:
-            if not year:
-                return [MovieInfo(*movie) for movie in movies]
-            else:
-                return [
-                    MovieInfo(*movie)
-                    for movie in movies
-                    if year - 1 <= movie[1] <= year + 1
-                ]
+            return list(islice(movies, FETCH_SEARCH_LIMIT))
+        except Exception:
+            logger.exception("Error searching for %s (%s)", title, year)
+            return []
+        finally:
+            # Stop the search once enough titles are found
+            movies.close()
+
+
+def fetch_movie_infos(
+    imdb_ids: list[str], progress_callback: Callable[[int], None]
+) -> list[MovieInfo]:
+    """
+    Look up several IMDb ids at once. The titles that are found are returned in the
+    order of their IMDb ids. If none are found, a failed lookup of the first IMDb id
+    is returned.
+    """
+
+    rows = query_by_imdb_ids(imdb_ids)
+    movie_infos = [
+        MovieInfo(title=rows[imdb_id][0], year=rows[imdb_id][1], imdb_id=imdb_id)
+        for imdb_id in imdb_ids
+        if imdb_id in rows
+    ]
+    return movie_infos or [MovieInfo(title="", year=None, imdb_id=imdb_ids[0])]
+
+
+def search_movie_info(
+    title: str,
+    year: int | None,
+    progress_callback: SignalInstance,
+    cancel_event: threading.Event,
+    partial_callback: SignalInstance,
+    time_budget: float | None = None,
+    scope: TitleScope = TitleScope.ALL,
+) -> int:
+    """
+    Search by title and (optionally) year, emitting the results in batches via
+    partial_callback as they are found. The search stops early when cancel_event is
+    set, or when the time budget (in seconds) is exhausted.
+
+    If the database has ratings, only the best matches are found, best first.
+
+    :return: number of titles found
+    """
+
+    budget = QueryBudget(cancel_event=cancel_event, time_budget=time_budget)
+    if ratings_exist():
+        batches = iter_ranked_movie_info(title, year, budget, scope=scope)
+    else:
+        batches = iter_movie_info(title, year, budget, scope)
+    found = 0
+    for movies in batches:
+        found += len(movies)
+        partial_callback.emit(movies)
+    return found
 
 
 def make_imdb_url(imdb_id: str) -> str:
     return f"https://www.imdb.com/title/{imdb_id}/"
 
 
+# Characters removed from titles to make them valid folder names
+FOLDER_NAME_INVALID_CHARACTERS = r'\:*?"<>|./!'
+
+
 def sanitise_title(title: str) -> str:
-    for c in r'\:*?"<>|./!':
+    for c in FOLDER_NAME_INVALID_CHARACTERS:
         title = title.replace(c, "")
     return title
+
+
+def jellyfin_folder_name(title: str, year: int | str, imdb_id: str = "") -> str:
+    """
+    :return: folder name in the format Jellyfin expects, e.g.
+     "The Matrix (1999) [imdbid-tt0133093]"
+    """
+
+    text = f"{sanitise_title(title)} ({year})"
+    if imdb_id:
+        text = f"{text} [imdbid-{imdb_id}]"
+    return text
@@ -0,0 +1,150 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Opt-in profiling of background tasks, so a slow import or search can be captured on
+a user's machine without a debug build.
+
+Enable it by setting the environment variable MODEST_MOVIE_METADATA_PROFILE to 1,
+or the Profile_Workers program setting to true. Each task then saves a cProfile
+profile and a text report of its hot spots and peak memory allocation to the
+profiles subdirectory of the log directory.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from qtpy.QtCore import QSettings
+
+from modestmoviemetadata.tools.filetools import program_appdata_directory
+from modestmoviemetadata.tools.logtools import (
+    get_logger,
+    get_program_logging_directory,
+)
+from modestmoviemetadata.tools.utilities import format_bytes
+
+logger = get_logger()
+
+profile_env_var = "MODEST_MOVIE_METADATA_PROFILE"
+
+# Number of stack frames tracemalloc records for each allocation
+TRACEMALLOC_FRAMES = 10
+
+# cProfile and tracemalloc are process wide, so only one task is profiled at a time
+_lock = threading.Lock()
+
+
+# Whether profiling is enabled, read once, because every task checks it
+_enabled: bool | None = None
+
+
+def profiling_enabled() -> bool:
+    """
+    :return: whether profiling is enabled. The environment and program setting are
+     read the first time, so changing them takes effect when the program is next
+     started.
+    """
+
+    global _enabled
+    if _enabled is None:
+        if os.environ.get(profile_env_var, "") not in ("", "0"):
+            _enabled = True
+        else:
+            _enabled = QSettings().value("Profile_Workers", False, type=bool)
+    return _enabled
+
+
+def profiles_directory() -> Path | None:
+    log_dir = get_program_logging_directory(program_appdata_directory())
+    if log_dir is None:
+        return None
+    directory = log_dir / "profiles"
+    try:
+        directory.mkdir(exist_ok=True)
+    except OSError as e:
+        logger.error("Unable to create profiles directory %s: %s", directory, e)
+        return None
+    return directory
+
+
+def run_profiled(fn, *args, **kwargs):
+    """
+    Run the function under cProfile and tracemalloc, and save the results.
+
+    If another task is already being profiled, the function runs unprofiled.
+    """
+
+    name = getattr(fn, "__name__", "task")
+    if not _lock.acquire(blocking=False):
+        logger.debug("Not profiling %s: another task is being profiled", name)
+        return fn(*args, **kwargs)
+
+    try:
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        started = datetime.now()
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing:
+                tracemalloc.stop()
+            save_profile(name, started, elapsed, peak, profiler, snapshot)
+    finally:
+        _lock.release()
+
+
+def save_profile(
+    name: str,
+    started: datetime,
+    elapsed: float,
+    peak: int,
+    profiler: cProfile.Profile,
+    snapshot: tracemalloc.Snapshot,
+) -> None:
+    directory = profiles_directory()
+    if directory is None:
+        return
+    stem = f"{name}-{started:%Y%m%d-%H%M%S}"
+
+    stats_text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stats_text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(30)
+
+    lines = [
+        f"Task: {name}",
+        f"Started: {started.isoformat(timespec='seconds')}",
+        f"Elapsed: {elapsed:.3f} seconds",
+        f"Peak traced memory: {format_bytes(peak)}",
+        "",
+        "Largest allocations still held at the end of the task:",
+    ]
+    lines.extend(f"  {stat}" for stat in snapshot.statistics("lineno")[:20])
+    lines.extend(("", stats_text.getvalue()))
+
+    try:
+        profiler.dump_stats(directory / f"{stem}.prof")
+        (directory / f"{stem}.txt").write_text("\n".join(lines), encoding="utf-8")
+    except OSError as e:
+        logger.error("Unable to save profile of %s: %s", name, e)
+        return
+    logger.info(
+        "Profile of %s saved to %s (%.3f seconds, peak memory %s)",
+        name,
+        directory / f"{stem}.prof",
+        elapsed,
+        format_bytes(peak),
+    )
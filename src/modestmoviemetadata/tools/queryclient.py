@@ -0,0 +1,137 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Client of the local query service, for scripts that look up titles using the
+running instance of the program rather than reading the database themselves.
+
+    with QueryClient() as client:
+        print(client.lookup("tt0133093"))
+
+The client blocks while waiting for responses, so it does not need a Qt event loop.
+"""
+
+import itertools
+
+from qtpy.QtNetwork import QLocalSocket
+
+from modestmoviemetadata.config import app_guid
+from modestmoviemetadata.tools.database import TitleScope
+from modestmoviemetadata.tools.queryservice import (
+    SEARCH_TIME_BUDGET,
+    RequestError,
+    decode_message,
+    encode_message,
+)
+
+# Milliseconds a search's response may take beyond the service's time budget for the
+# search, e.g. while the program is busy
+SEARCH_TIMEOUT_MARGIN = 5000
+
+
+class QueryClientError(Exception):
+    """The query service could not be reached, or could not answer a request"""
+
+
+class QueryClient:
+    def __init__(self, server_name: str = app_guid, timeout: int = 5000) -> None:
+        """
+        :param server_name: name of the program's local server
+        :param timeout: milliseconds to wait to connect, and for each response
+        """
+
+        self.server_name = server_name
+        self.timeout = timeout
+        self.socket: QLocalSocket | None = None
+        self.request_ids = itertools.count(1)
+
+    def connect(self) -> None:
+        """
+        :raises QueryClientError: the program is not running
+        """
+
+        self.socket = QLocalSocket()
+        self.socket.connectToServer(self.server_name)
+        if not self.socket.waitForConnected(self.timeout):
+            error = self.socket.errorString()
+            self.socket = None
+            raise QueryClientError(f"Unable to connect to the query service: {error}")
+
+    def close(self) -> None:
+        if self.socket is not None:
+            self.socket.disconnectFromServer()
+            self.socket = None
+
+    def __enter__(self) -> "QueryClient":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def request(self, method: str, timeout: int | None = None, **params) -> object:
+        """
+        Send a request and wait for its response
+
+        :param timeout: milliseconds to wait for the response, or None to use the
+         client's timeout
+        :return: the request's result
+        :raises QueryClientError: the request failed
+        """
+
+        timeout = self.timeout if timeout is None else timeout
+        if self.socket is None:
+            self.connect()
+        request_id = next(self.request_ids)
+        self.socket.write(
+            encode_message({"id": request_id, "method": method, "params": params})
+        )
+        if not self.socket.waitForBytesWritten(self.timeout):
+            raise QueryClientError(
+                f"Unable to send request: {self.socket.errorString()}"
+            )
+
+        while True:
+            while not self.socket.canReadLine():
+                if not self.socket.waitForReadyRead(timeout):
+                    raise QueryClientError(
+                        f"No response to request: {self.socket.errorString()}"
+                    )
+            try:
+                response = decode_message(bytes(self.socket.readLine()))
+            except RequestError as e:
+                raise QueryClientError(str(e)) from e
+            # Skip responses to earlier requests that timed out
+            if response.get("id") == request_id:
+                break
+
+        if "error" in response:
+            raise QueryClientError(response["error"])
+        return response.get("result")
+
+    def lookup(self, imdb_id: str) -> dict | None:
+        return self.request("lookup", imdb_id=imdb_id)
+
+    def lookup_batch(self, imdb_ids: list[str]) -> list[dict]:
+        return self.request("lookup_batch", imdb_ids=imdb_ids)
+
+    def search(
+        self,
+        title: str,
+        year: int | None = None,
+        limit: int | None = None,
+        scope: TitleScope | str | None = None,
+    ) -> list[dict]:
+        """
+        :param scope: kinds of title to find, e.g. TitleScope.MOVIES or "movies", or
+         None for all kinds
+        """
+
+        params = {"title": title, "year": year}
+        if limit is not None:
+            params["limit"] = limit
+        if scope is not None:
+            params["scope"] = scope.value if isinstance(scope, TitleScope) else scope
+        # A search may take as long as the service's time budget allows
+        timeout = max(self.timeout, SEARCH_TIME_BUDGET * 1000 + SEARCH_TIMEOUT_MARGIN)
+        return self.request("search", timeout, **params)
@@ -0,0 +1,171 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Protocol of the local query service, with which the running instance of the program
+answers lookups for other programs, e.g. scripts or a second instance of the program.
+
+Clients connect to the program's single instance local socket (see
+QtSingleApplication) and send requests, one per line, each a UTF-8 encoded JSON
+object:
+
+    {"id": 1, "method": "lookup", "params": {"imdb_id": "tt0133093"}}
+
+Each request is answered with one line, in the order it is completed, so clients
+match responses to requests using the id:
+
+    {"id": 1, "result": {"title": "The Matrix", "year": 1999, "imdb_id": "tt0133093"}}
+    {"id": 2, "error": "Unknown method: foo"}
+
+Methods:
+
+    activate        Raise the program's main window. No response is sent.
+    ping            Returns "pong".
+    lookup          params: imdb_id. Returns a title, or null if it is not found.
+    lookup_batch    params: imdb_ids, a list. Returns the titles that are found.
+    search          params: title, and optionally year, limit and scope, one of
+                    "all" (the default), "movies" or "series". Returns titles
+                    whose title contains the search text: if the database has
+                    ratings, titles matching the whole title first, then the most
+                    voted for titles.
+"""
+
+import json
+from dataclasses import asdict
+from itertools import islice
+
+from modestmoviemetadata.tools.database import QueryBudget, TitleScope, query_by_imdb_id
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.movieinfo import (
+    MovieInfo,
+    fetch_movie_infos,
+    imdb_id_pattern,
+    iter_movie_info,
+    ranked_movie_info,
+)
+
+logger = get_logger()
+
+# Requests longer than this are rejected, and their connection closed
+MAX_REQUEST_SIZE = 1024 * 1024
+
+# Maximum number of results a search returns, and its time budget in seconds
+DEFAULT_SEARCH_LIMIT = 100
+MAX_SEARCH_LIMIT = 10_000
+SEARCH_TIME_BUDGET = 10
+
+# Requests handled by the program itself, rather than answered with a query
+ACTIVATE = "activate"
+
+
+class RequestError(Exception):
+    """A request was malformed or could not be answered"""
+
+
+def encode_message(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def decode_message(line: bytes) -> dict:
+    """
+    :raises RequestError: the line is not a JSON object
+    """
+
+    try:
+        message = json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise RequestError(f"Invalid message: {e}") from e
+    if not isinstance(message, dict):
+        raise RequestError("Invalid message: not a JSON object")
+    return message
+
+
+def is_imdb_id(imdb_id: object) -> bool:
+    return isinstance(imdb_id, str) and imdb_id_pattern.fullmatch(imdb_id) is not None
+
+
+def lookup(params: dict) -> dict | None:
+    imdb_id = params.get("imdb_id")
+    if not is_imdb_id(imdb_id):
+        raise RequestError("lookup requires an imdb_id, e.g. tt0133093")
+    data = query_by_imdb_id(imdb_id)
+    if data is None:
+        return None
+    title, year = data
+    return asdict(MovieInfo(title=title, year=year, imdb_id=imdb_id))
+
+
+def lookup_batch(params: dict) -> list[dict]:
+    imdb_ids = params.get("imdb_ids")
+    if not isinstance(imdb_ids, list) or not all(is_imdb_id(i) for i in imdb_ids):
+        raise RequestError(
+            'lookup_batch requires a list of imdb_ids, e.g. ["tt0133093"]'
+        )
+    if not imdb_ids:
+        return []
+    return [
+        asdict(movie_info)
+        for movie_info in fetch_movie_infos(imdb_ids, None)
+        if movie_info.title
+    ]
+
+
+def search(params: dict) -> list[dict]:
+    title = params.get("title")
+    year = params.get("year")
+    limit = params.get("limit", DEFAULT_SEARCH_LIMIT)
+    scope = params.get("scope", TitleScope.ALL.value)
+    if not isinstance(title, str) or not title:
+        raise RequestError("search requires a title")
+    if year is not None and not isinstance(year, int):
+        raise RequestError("year must be an integer")
+    if not isinstance(limit, int) or not 0 < limit <= MAX_SEARCH_LIMIT:
+        raise RequestError(f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+    try:
+        scope = TitleScope(scope)
+    except ValueError:
+        scopes = ", ".join(s.value for s in TitleScope)
+        raise RequestError(f"scope must be one of {scopes}") from None
+
+    budget = QueryBudget(time_budget=SEARCH_TIME_BUDGET)
+    ranked = ranked_movie_info(title, year, budget, limit, scope)
+    if ranked is not None:
+        return [asdict(movie_info) for movie_info in ranked]
+    movie_infos = (
+        movie_info
+        for batch in iter_movie_info(title, year, budget, scope)
+        for movie_info in batch
+    )
+    return [asdict(movie_info) for movie_info in islice(movie_infos, limit)]
+
+
+methods = {
+    "ping": lambda params: "pong",
+    "lookup": lookup,
+    "lookup_batch": lookup_batch,
+    "search": search,
+}
+
+
+def answer_request(request: dict, progress_callback=None) -> dict:
+    """
+    Run the query the request asks for. Called in a worker thread.
+
+    :return: the response to send to the client
+    """
+
+    response = {"id": request.get("id")}
+    method = request.get("method")
+    params = request.get("params", {})
+    try:
+        if method not in methods:
+            raise RequestError(f"Unknown method: {method}")
+        if not isinstance(params, dict):
+            raise RequestError("params must be a JSON object")
+        response["result"] = methods[method](params)
+    except RequestError as e:
+        response["error"] = str(e)
+    except Exception as e:
+        logger.exception("Error answering %s request", method)
+        response["error"] = f"{e.__class__.__name__}: {e}"
+    return response
@@ -0,0 +1,174 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Trace database queries: their latency, the number of rows they return, and a sample
+of their query plans. Slow queries are written to their own log file.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from modestmoviemetadata.tools.filetools import program_appdata_directory
+from modestmoviemetadata.tools.logtools import (
+    get_logger,
+    get_program_logging_directory,
+)
+
+logger = get_logger()
+
+slow_query_log_name = "slow-queries.log"
+
+# Upper bounds of the latency histogram buckets, in milliseconds. The last bucket
+# holds everything slower.
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Queries slower than this many seconds are written to the slow query log
+SLOW_QUERY_SECONDS = 0.5
+
+# The first query of each kind has its query plan explained, and thereafter one in
+# every PLAN_SAMPLE_INTERVAL queries
+PLAN_SAMPLE_INTERVAL = 50
+
+
+@dataclass
+class Trace:
+    kind: str
+    sql: str
+    plan: list[str] = field(default_factory=list)
+    rows: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    histogram: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+    plan: list[str] = field(default_factory=list)
+
+    def add(self, trace: Trace) -> None:
+        self.count += 1
+        self.rows += trace.rows
+        self.total_seconds += trace.seconds
+        self.max_seconds = max(self.max_seconds, trace.seconds)
+        self.histogram[bisect_right(LATENCY_BUCKETS, trace.seconds * 1000)] += 1
+        if trace.plan:
+            self.plan = trace.plan
+
+
+class QueryTracer:
+    """Thread safe collection of query statistics"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.stats: dict[str, QueryStats] = {}
+
+    def sample_plan(self, kind: str) -> bool:
+        with self.lock:
+            count = self.stats[kind].count if kind in self.stats else 0
+        return count % PLAN_SAMPLE_INTERVAL == 0
+
+    @contextmanager
+    def trace(
+        self,
+        kind: str,
+        conn: sqlite3.Connection | None = None,
+        sql: str = "",
+        params: Sequence = (),
+    ) -> Iterator[Trace]:
+        """
+        Time the query run within the context. The caller sets the trace's row count.
+
+        :param kind: query type, used to group statistics
+        :param conn: connection the query is run on, used to explain the query plan
+        :param sql: the query
+        :param params: the query's parameters
+        """
+
+        trace = Trace(kind=kind, sql=" ".join(sql.split()))
+        if conn is not None and sql and self.sample_plan(kind):
+            try:
+                trace.plan = [
+                    row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                ]
+            except sqlite3.Error as e:
+                logger.debug("Unable to explain query plan: %s", e)
+
+        start = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            trace.seconds = time.perf_counter() - start
+            with self.lock:
+                self.stats.setdefault(kind, QueryStats()).add(trace)
+            if trace.seconds >= SLOW_QUERY_SECONDS:
+                self.log_slow_query(trace)
+
+    def log_slow_query(self, trace: Trace) -> None:
+        log_dir = get_program_logging_directory(program_appdata_directory())
+        if log_dir is None:
+            return
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "kind": trace.kind,
+            "seconds": round(trace.seconds, 3),
+            "rows": trace.rows,
+            "sql": trace.sql,
+            "plan": trace.plan,
+        }
+        try:
+            with (
+                self.lock,
+                open(log_dir / slow_query_log_name, "a", encoding="utf-8") as f,
+            ):
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning("Unable to write to the slow query log: %s", e)
+
+    def summary(self) -> str:
+        with self.lock:
+            stats = {kind: s for kind, s in sorted(self.stats.items())}
+            if not stats:
+                return "No database queries have run yet."
+
+            # Wide enough for the longest kind, and a space after it
+            width = max(len(kind) for kind in (*stats, "Query")) + 1
+            lines = [
+                f"{'Query':<{width}}{'Count':>8}{'Mean ms':>10}{'Max ms':>10}"
+                f"{'Rows':>10}"
+            ]
+            for kind, s in stats.items():
+                lines.append(
+                    f"{kind:<{width}}{s.count:>8}"
+                    f"{s.total_seconds * 1000 / s.count:>10.2f}"
+                    f"{s.max_seconds * 1000:>10.2f}{s.rows:>10}"
+                )
+
+            labels = [f"< {b:g} ms" for b in LATENCY_BUCKETS]
+            labels.append(f">= {LATENCY_BUCKETS[-1]:g} ms")
+            for kind, s in stats.items():
+                lines.extend(("", f"{kind} latency"))
+                lines.extend(
+                    f"  {label:<12}{n:>8}"
+                    for label, n in zip(labels, s.histogram, strict=True)
+                    if n
+                )
+                if s.plan:
+                    lines.append(f"{kind} query plan")
+                    lines.extend(f"  {detail}" for detail in s.plan)
+        return "\n".join(lines)
+
+
+tracer = QueryTracer()
@@ -0,0 +1,131 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Timing of each stage of the dataset download and import, written to the log and to a
+JSON run report so runs can be compared across dataset releases and machines.
+"""
+
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from modestmoviemetadata.config import version
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.utilities import format_bytes
+
+logger = get_logger()
+
+
+@dataclass
+class Span:
+    name: str
+    seconds: float = 0.0
+    bytes: int = 0
+    rows: int = 0
+
+    def as_dict(self) -> dict[str, float | int | str]:
+        span = {
+            "name": self.name,
+            "seconds": round(self.seconds, 3),
+            "bytes": self.bytes,
+            "rows": self.rows,
+        }
+        if self.seconds:
+            span["bytes_per_second"] = round(self.bytes / self.seconds)
+            span["rows_per_second"] = round(self.rows / self.seconds)
+        return span
+
+    def __str__(self) -> str:
+        text = f"{self.name}: {self.seconds:.2f}s"
+        if self.bytes:
+            text += f", {format_bytes(self.bytes)}"
+            if self.seconds:
+                text += f" ({format_bytes(round(self.bytes / self.seconds))}/s)"
+        if self.rows:
+            text += f", {self.rows} rows"
+            if self.seconds:
+                text += f" ({round(self.rows / self.seconds)} rows/s)"
+        return text
+
+
+class RunReport:
+    """Spans timing each stage of a dataset download and import"""
+
+    def __init__(self) -> None:
+        self.started = datetime.now().astimezone()
+        self.spans: dict[str, Span] = {}
+        self.info: dict[str, str | int] = {}
+        # Bytes used by each table and index in the database
+        self.space: dict[str, int] = {}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        """
+        Time the stage run within the context. The caller sets the span's byte and
+        row counts.
+        """
+
+        span = self.spans.setdefault(name, Span(name=name))
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds += time.perf_counter() - start
+            logger.info("%s", span)
+
+    def add(self, name: str, seconds: float, bytes: int = 0, rows: int = 0) -> None:
+        """
+        Add to the totals of a stage that is timed in pieces, e.g. because it is
+        interleaved with another stage
+        """
+
+        span = self.spans.setdefault(name, Span(name=name))
+        span.seconds += seconds
+        span.bytes += bytes
+        span.rows += rows
+
+    def as_dict(self, status: str) -> dict:
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "status": status,
+            "program_version": version,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "frozen": getattr(sys, "frozen", False),
+            "info": self.info,
+            "spans": [span.as_dict() for span in self.spans.values()],
+            "space": self.space,
+        }
+
+    def write(self, directory: Path, status: str) -> Path | None:
+        """
+        Write the report as JSON to the reports subdirectory of the directory
+
+        :param directory: program appdata directory
+        :param status: how the run ended, e.g. "completed" or "failed"
+        :return: path of the report, or None on error
+        """
+
+        reports = directory / "reports"
+        path = reports / f"import-{self.started:%Y%m%d-%H%M%S}.json"
+        try:
+            reports.mkdir(exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.as_dict(status), f, indent=2)
+        except OSError as e:
+            logger.error("Unable to write run report %s: %s", path, e)
+            return None
+        logger.debug("Run report written to %s", path)
+        return path
@@ -0,0 +1,254 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+In-memory store of the database's titles, for title searches that do not scan
+SQLite. It is optional, because it uses a few hundred megabytes of memory.
+
+The store is columnar:
+
+blob
+    every primary title, UTF-8 encoded with its ASCII letters in lower case, each
+    followed by a line feed
+offsets
+    uint32 offset into the blob of each title, plus the offset of the blob's end
+years
+    uint16 year of each title, 0 when unknown
+types
+    uint8 code of each title's type, 0 when unknown
+tconsts
+    uint32 numeric part of each title's IMDb id, e.g. 84988 for tt0084988
+
+Titles are in the same order as in the titles table, so searches find titles in
+the same order as SQLite does. A search is a scan of the blob using bytes.find(),
+which skips from one match to the next, so no Python objects are created for
+titles that do not match. Like SQLite's LIKE, it ignores the case of ASCII letters
+only, and the search text is matched literally.
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator
+from contextlib import closing
+
+from modestmoviemetadata.tools.database import (
+    QueryBudget,
+    QueryCancelled,
+    TitleScope,
+    database_generation,
+    open_read_connection,
+    title_types_exist,
+)
+from modestmoviemetadata.tools.idindex import tconst_to_int
+from modestmoviemetadata.tools.imdbsqlite import ImportCancelled
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.querytrace import tracer
+from modestmoviemetadata.tools.utilities import format_bytes
+
+logger = get_logger()
+
+separator = b"\n"
+
+# Number of rows read from the database at a time while loading the store
+LOAD_BATCH_SIZE = 10_000
+
+# Number of matches between checks of a search's cancellation and time budget
+BUDGET_CHECK_INTERVAL = 1000
+
+
+class TitleStore:
+    def __init__(self) -> None:
+        self.blob = bytearray()
+        self.offsets = array("I", [0])
+        self.years = array("H")
+        self.types = array("B")
+        self.tconsts = array("I")
+        # Whether the database the store was loaded from has title types
+        self.has_types = False
+        # Generation of the database the store was loaded from
+        self.generation = database_generation()
+
+    def __len__(self) -> int:
+        return len(self.tconsts)
+
+    def size(self) -> int:
+        """
+        :return: approximate number of bytes of memory used
+        """
+
+        return len(self.blob) + sum(
+            len(a) * a.itemsize
+            for a in (self.offsets, self.years, self.types, self.tconsts)
+        )
+
+    def load(self, cancel_event: threading.Event | None = None) -> None:
+        """
+        Load the titles from the database
+
+        :raises ImportCancelled: loading was cancelled, or the database is being
+         replaced
+        """
+
+        # Appended to in place, to avoid copying it
+        blob = bytearray()
+        offset = 0
+        self.has_types = title_types_exist()
+        title_type = "IFNULL(title_type, 0)" if self.has_types else "0"
+        with closing(open_read_connection()) as conn:
+            # Replacing the database interrupts the query
+            generation = database_generation()
+            c = conn.execute(
+                f"""
+                SELECT IFNULL(primary_title, ''), IFNULL(premiered, 0),
+                    {title_type}, title_id
+                FROM titles
+                """
+            )
+            try:
+                while rows := c.fetchmany(LOAD_BATCH_SIZE):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ImportCancelled("title store")
+                    encoded = []
+                    for title, year, type_code, title_id in rows:
+                        tconst = tconst_to_int(title_id)
+                        if tconst is None:
+                            continue
+                        title_bytes = title.encode("utf-8").lower() + separator
+                        encoded.append(title_bytes)
+                        offset += len(title_bytes)
+                        self.offsets.append(offset)
+                        self.years.append(year)
+                        self.types.append(type_code)
+                        self.tconsts.append(tconst)
+                    blob += b"".join(encoded)
+            except sqlite3.OperationalError as e:
+                if generation != database_generation():
+                    raise ImportCancelled("title store") from e
+                raise
+        self.blob = blob
+        self.generation = generation
+
+    def search(
+        self,
+        title: str,
+        budget: QueryBudget,
+        year: int | None = None,
+        batch_size: int = 500,
+        scope: TitleScope = TitleScope.ALL,
+    ) -> Iterator[list[tuple[int, int]]]:
+        """
+        Yield batches of titles whose title contains the search text, ignoring the
+        case of ASCII letters
+
+        Each title is (tconst, year), with unknown years as 0. The year and title type
+        of each title that contains the search text are checked in turn. When the
+        time budget is exhausted, the search stops early with the results found so
+        far.
+
+        :param year: if given, only titles from this year, give or take one year,
+         match
+        :param scope: kinds of title to find. Ignored if the database the store was
+         loaded from lacks title types.
+        :raises QueryCancelled: the search was cancelled
+        """
+
+        needle = title.encode("utf-8").lower()
+        blob = self.blob
+        offsets = self.offsets
+        years = self.years
+        types = self.types
+        tconsts = self.tconsts
+        first_year, last_year = (year - 1, year + 1) if year else (0, 0xFFFF)
+        codes = scope.type_codes() if self.has_types else None
+
+        def exhausted() -> bool:
+            if budget.cancelled():
+                raise QueryCancelled(title)
+            if budget.expired():
+                logger.warning(
+                    "Search for %s stopped after exhausting its time budget of %s "
+                    "seconds",
+                    title,
+                    budget.time_budget,
+                )
+                return True
+            return False
+
+        budget.start()
+        batch = []
+        matches = 0
+        with tracer.trace("title_store_search") as trace:
+            position = blob.find(needle)
+            while 0 <= position < len(blob):
+                row = bisect_right(offsets, position) - 1
+                if first_year <= years[row] <= last_year and (
+                    codes is None or types[row] in codes
+                ):
+                    batch.append((tconsts[row], years[row]))
+                matches += 1
+                if len(batch) == batch_size:
+                    trace.rows += len(batch)
+                    yield batch
+                    batch = []
+                    if exhausted():
+                        break
+                elif matches % BUDGET_CHECK_INTERVAL == 0 and exhausted():
+                    break
+                # Each title is matched at most once
+                position = blob.find(needle, offsets[row + 1])
+            if batch:
+                trace.rows += len(batch)
+                yield batch
+
+
+_lock = threading.Lock()
+_store: TitleStore | None = None
+
+
+def load_title_store(
+    progress_callback=None, cancel_event: threading.Event | None = None
+) -> int:
+    """
+    Load the title store, replacing any store already loaded. Called in a worker
+    thread.
+
+    :return: number of titles loaded
+    :raises ImportCancelled: loading was cancelled
+    """
+
+    global _store
+    start = time.perf_counter()
+    store = TitleStore()
+    store.load(cancel_event)
+    with _lock:
+        _store = store
+    logger.info(
+        "Loaded %s titles into memory (%s) in %.2f seconds",
+        len(store),
+        format_bytes(store.size()),
+        time.perf_counter() - start,
+    )
+    return len(store)
+
+
+def title_store() -> TitleStore | None:
+    """
+    :return: the title store, or None if it is not loaded, or if the database has
+     changed since it was loaded
+    """
+
+    global _store
+    with _lock:
+        if _store is not None and _store.generation != database_generation():
+            logger.debug("Discarding title store of a previous database")
+            _store = None
+        return _store
+
+
+def unload_title_store() -> None:
+    global _store
+    with _lock:
+        _store = None
@@ -0,0 +1,122 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Parse a TSV file, gzipped or not, using several processes.
+
+The file is decompressed in the calling process and cut into chunks that end at a
+line boundary. Worker processes split the chunks into rows, which are returned in
+the order they appear in the file, so that a single writer can insert them.
+
+This module is imported by the worker processes, so it imports nothing it does not
+need.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from modestmoviemetadata.tools.decompress import open_dataset
+
+# Size of the decompressed chunks sent to the worker processes
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Maximum number of worker processes. Beyond this the database writer, not
+# parsing, limits the import's speed.
+MAX_PARSE_WORKERS = 8
+
+# Number of chunks each worker may have queued, which bounds memory use when the
+# writer is slower than the workers
+CHUNKS_PER_WORKER = 2
+
+
+def default_parse_workers() -> int:
+    """
+    :return: number of worker processes to parse with, leaving a core for the
+     writer, or 1 if parsing should be done in the calling process
+    """
+
+    cpus = os.cpu_count() or 1
+    return max(1, min(MAX_PARSE_WORKERS, cpus - 1))
+
+
+def column_indices(header: str, names: Sequence[str]) -> list[int]:
+    """
+    :return: indices of the named columns that are in the file's header line
+    """
+
+    headers = [x.strip() for x in header.split("\t")]
+    return [headers.index(name) for name in names if name in headers]
+
+
+def iter_chunks(f, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield chunks of a binary file, each ending at the end of a line
+    """
+
+    remainder = b""
+    while chunk := f.read(chunk_size):
+        end = chunk.rfind(b"\n") + 1
+        if end:
+            yield remainder + chunk[:end]
+            remainder = chunk[end:]
+        else:
+            remainder += chunk
+    if remainder:
+        yield remainder
+
+
+def parse_chunk(
+    chunk: bytes, indices: Sequence[int], null: str = "\\N"
+) -> list[list[str | None]]:
+    """
+    Parse lines of a chunk in the same way as imdbsqlite.tsv(). Runs in a worker
+    process.
+
+    :param indices: indices of the columns to return
+    :return: the chosen columns' values of each line
+    """
+
+    lines = chunk.decode("utf-8").split("\n")
+    if not lines[-1]:
+        # The chunk ends with a line break
+        lines.pop()
+    rows = []
+    for line in lines:
+        values = [
+            (x.strip() if x and x != null else None) for x in line.rstrip().split("\t")
+        ]
+        # Like zip(), which tsv() uses, ignore columns missing from short lines
+        rows.append([values[i] for i in indices if i < len(values)])
+    return rows
+
+
+def iter_parsed_batches(
+    filename: str, names: Sequence[str], workers: int
+) -> Iterator[list[list[str | None]]]:
+    """
+    Yield batches of parsed rows of a TSV file, gzipped or not, in file order.
+    Closing the generator cancels the parsing of chunks not yet parsed.
+
+    :param names: names of the columns to return, in order
+    :param workers: number of worker processes
+    """
+
+    with open_dataset(filename) as f:
+        indices = column_indices(f.readline().decode("utf-8"), names)
+        pending: deque[Future] = deque()
+        # Forking a process that has other threads running, e.g. Qt's, is unsafe
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            for chunk in iter_chunks(f):
+                pending.append(executor.submit(parse_chunk, chunk, indices))
+                if len(pending) >= workers * CHUNKS_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
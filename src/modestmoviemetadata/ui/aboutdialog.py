@@ -28,6 +28,7 @@ from qtpy.QtWidgets import (
 
 from modestmoviemetadata.config import application_name, copyright_message, version
 from modestmoviemetadata.tools.utilities import data_file_path, pyqt_api
+from modestmoviemetadata.ui.diagnosticsdialog import DiagnosticsDialog
 
 
 class AboutDialog(QDialog):
@@ -186,6 +187,10 @@ class AboutDialog(QDialog):
         )
         self.creditsButton.setDefault(False)
         self.creditsButton.setCheckable(True)
+        diagnosticsButton = buttonBox.addButton(
+            "Diagnostics", QDialogButtonBox.ButtonRole.HelpRole
+        )
+        diagnosticsButton.setDefault(False)
         closeButton.setDefault(True)
 
         buttonLayout = QVBoxLayout()
@@ -204,6 +209,7 @@ class AboutDialog(QDialog):
 
         buttonBox.rejected.connect(self.reject)
         self.creditsButton.clicked.connect(self.creditsButtonClicked)
+        diagnosticsButton.clicked.connect(self.diagnosticsButtonClicked)
 
         closeButton.setFocus()
 
@@ -211,6 +217,11 @@ class AboutDialog(QDialog):
     def creditsButtonClicked(self) -> None:
         self.showStackItem()
 
+    @Slot()
+    def diagnosticsButtonClicked(self) -> None:
+        diagnostics = DiagnosticsDialog(parent=self)
+        diagnostics.exec()
+
     @Slot()
     def showStackItem(self) -> None:
         if self.creditsButton.isChecked():
@@ -2,8 +2,15 @@
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
 import sys
+import threading
+from enum import Enum, auto
 
-from qtpy.QtCore import QObject, QRunnable, Signal, Slot
+from qtpy.QtCore import QObject, QRunnable, Qt, QThread, QThreadPool, Signal, Slot
+
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.profiling import profiling_enabled, run_profiled
+
+logger = get_logger()
 
 # Taken from "Multithreading PyQt5 applications with QThreadPool"
 # https://www.pythonguis.com/tutorials/multithreading-pyqt-applications-qthreadpool/
@@ -25,12 +32,23 @@ class WorkerSignals(QObject):
     result
         object data returned from processing, anything
 
+    progress
+        tuple (text, value, maximum)
+
+    partial
+        object partial results, emitted while processing continues
+
+    cancelled
+        No data
+
     """
 
     finished = Signal()
     error = Signal(Exception)
     result = Signal(object)
     progress = Signal(tuple)
+    partial = Signal(object)
+    cancelled = Signal()
 
 
 class Worker(QRunnable):
@@ -45,6 +63,7 @@ class Worker(QRunnable):
     :param args: Arguments to pass to the callback function
     :param kwargs: Keywords to pass to the callback function
 
+    When profiling is enabled, the callback function is run under the profiler.
     """
 
     def __init__(self, fn, *args, **kwargs):
@@ -54,10 +73,16 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        self.profile = profiling_enabled()
 
         # Add the callback to our kwargs
         self.kwargs["progress_callback"] = self.signals.progress
 
+    def call(self):
+        if self.profile:
+            return run_profiled(self.fn, *self.args, **self.kwargs)
+        return self.fn(*self.args, **self.kwargs)
+
     @Slot()
     def run(self):
         """
@@ -66,10 +91,173 @@ class Worker(QRunnable):
 
         # Retrieve args/kwargs here; and fire processing using them
         try:
-            result = self.fn(*self.args, **self.kwargs)
+            result = self.call()
         except Exception:
             self.signals.error.emit(sys.exception())
         else:
             self.signals.result.emit(result)  # Return the result of the processing
         finally:
             self.signals.finished.emit()  # Done
+
+
+class CancellableWorker(Worker):
+    """
+    Worker thread that can be cancelled
+
+    In addition to progress_callback, the callback function is passed cancel_event,
+    a threading.Event it should check regularly. When the worker is cancelled, its
+    result or exception is discarded and the cancelled signal is emitted instead.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__(fn, *args, **kwargs)
+        self.cancel_event = threading.Event()
+        self.kwargs["cancel_event"] = self.cancel_event
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def isCancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @Slot()
+    def run(self):
+        try:
+            result = self.call()
+        except Exception:
+            if self.isCancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.error.emit(sys.exception())
+        else:
+            if self.isCancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class StreamingWorker(CancellableWorker):
+    """
+    Cancellable worker thread that streams partial results
+
+    The callback function is also passed partial_callback, with which it emits
+    partial results while it continues processing.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__(fn, *args, **kwargs)
+        self.kwargs["partial_callback"] = self.signals.partial
+
+
+class Lane(Enum):
+    """Lanes in which background work runs"""
+
+    # Dataset downloads and imports, and index creation, which can take minutes
+    MAINTENANCE = auto()
+    # Lookups and searches the user is waiting on
+    INTERACTIVE = auto()
+    # Work done while the program is otherwise idle, e.g. warming caches, which is
+    # cancelled as soon as work starts in another lane
+    IDLE = auto()
+
+
+# Priority of work within the interactive lane. Higher priority work runs first.
+PRIORITY_LOOKUP = 10
+PRIORITY_SEARCH = 0
+
+# Number of threads in the interactive lane
+INTERACTIVE_THREADS = 2
+
+
+class Scheduler(QObject):
+    """
+    Run background work in lanes, each with its own thread pool, so that lookups
+    never queue behind maintenance work.
+
+    Idle work gives way to all other work: when work starts in another lane, idle
+    work that has not yet started is discarded, and idle work that is running and
+    can be cancelled is cancelled.
+
+    Work started with a key coalesces with earlier work started with the same key:
+    if the earlier work has not yet started, it is discarded, and if it is running
+    and can be cancelled, it is cancelled.
+    """
+
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self.pools = {
+            Lane.MAINTENANCE: QThreadPool(self),
+            Lane.INTERACTIVE: QThreadPool(self),
+            Lane.IDLE: QThreadPool(self),
+        }
+        self.pools[Lane.MAINTENANCE].setMaxThreadCount(1)
+        self.pools[Lane.MAINTENANCE].setThreadPriority(QThread.Priority.LowPriority)
+        self.pools[Lane.INTERACTIVE].setMaxThreadCount(INTERACTIVE_THREADS)
+        # Keep the threads, and with them their database connections
+        self.pools[Lane.INTERACTIVE].setExpiryTimeout(-1)
+        self.pools[Lane.IDLE].setMaxThreadCount(1)
+        self.pools[Lane.IDLE].setThreadPriority(QThread.Priority.IdlePriority)
+        self.keyed: dict[str, Worker] = {}
+        # Work is referenced until it finishes, otherwise its signals can be garbage
+        # collected before they are emitted
+        self.queued: set[Worker] = set()
+        # Idle work that has not finished
+        self.idle: set[Worker] = set()
+
+    def start(
+        self,
+        worker: Worker,
+        lane: Lane = Lane.INTERACTIVE,
+        priority: int = 0,
+        key: str = "",
+    ) -> None:
+        """
+        :param worker: the work to run
+        :param lane: the lane to run it in
+        :param priority: priority relative to other work queued in the lane
+        :param key: if given, the work supersedes earlier work with the same key
+        """
+
+        pool = self.pools[lane]
+        if lane == Lane.IDLE:
+            self.idle.add(worker)
+        else:
+            self.cancelIdleWork()
+        if key:
+            stale = self.keyed.get(key)
+            if stale is not None:
+                if pool.tryTake(stale):
+                    logger.debug("Discarded queued work superseded by new %s", key)
+                    self.queued.discard(stale)
+                elif isinstance(stale, CancellableWorker):
+                    stale.cancel()
+            self.keyed[key] = worker
+        self.queued.add(worker)
+        # Workers are referenced until workerFinished() runs, which is queued after
+        # they finish. Were the thread pool to delete a finished worker, keyed and
+        # idle work could refer to a deleted object in the meantime.
+        worker.setAutoDelete(False)
+        worker.signals.finished.connect(
+            lambda: self.workerFinished(key, worker),
+            Qt.ConnectionType.QueuedConnection,
+        )
+        pool.start(worker, priority)
+
+    def cancelIdleWork(self) -> None:
+        pool = self.pools[Lane.IDLE]
+        for worker in list(self.idle):
+            if pool.tryTake(worker):
+                logger.debug("Discarded queued idle work")
+                self.idle.discard(worker)
+                self.queued.discard(worker)
+            elif isinstance(worker, CancellableWorker) and not worker.isCancelled():
+                logger.debug("Cancelling idle work")
+                worker.cancel()
+
+    def workerFinished(self, key: str, worker: Worker) -> None:
+        self.queued.discard(worker)
+        self.idle.discard(worker)
+        if key and self.keyed.get(key) is worker:
+            del self.keyed[key]
@@ -0,0 +1,48 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+from qtpy.QtCore import QObject, Slot
+from qtpy.QtGui import QFontDatabase
+from qtpy.QtWidgets import (
+    QDialog,
+    QDialogButtonBox,
+    QPlainTextEdit,
+    QVBoxLayout,
+)
+
+from modestmoviemetadata.tools.querytrace import tracer
+
+
+class DiagnosticsDialog(QDialog):
+    """
+    Display a summary of database query performance
+    """
+
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+
+        self.summary = QPlainTextEdit()
+        self.summary.setReadOnly(True)
+        self.summary.setFont(
+            QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
+        )
+        self.summary.setMinimumSize(560, 400)
+
+        buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        refreshButton = buttonBox.addButton(
+            "Refresh", QDialogButtonBox.ButtonRole.ActionRole
+        )
+        refreshButton.clicked.connect(self.refreshButtonClicked)
+        buttonBox.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.summary)
+        layout.addWidget(buttonBox)
+        self.setLayout(layout)
+
+        self.refreshButtonClicked()
+
+    @Slot()
+    def refreshButtonClicked(self) -> None:
+        self.summary.setPlainText(tracer.summary())
@@ -1,15 +1,26 @@
 #  SPDX-FileCopyrightText: 2022-2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
+from collections.abc import Callable
 from datetime import datetime
 from enum import Flag, auto
 from typing import cast
 
-import arrow
-from qtpy.QtCore import QObject, QSettings, QSize, Qt, QThreadPool, QTimer, Slot
+from qtpy.QtCore import (
+    QLocale,
+    QObject,
+    QSettings,
+    QSize,
+    QStringListModel,
+    Qt,
+    QTimer,
+    Slot,
+)
 from qtpy.QtGui import QFont, QGuiApplication, QIcon, QPixmap
 from qtpy.QtWidgets import (
     QCheckBox,
+    QComboBox,
+    QCompleter,
     QDialogButtonBox,
     QGridLayout,
     QHBoxLayout,
@@ -22,22 +33,32 @@ from qtpy.QtWidgets import (
 )
 
 from modestmoviemetadata.config import application_name
-from modestmoviemetadata.tools.audiotools import play_sound
+from modestmoviemetadata.tools.audiotools import play_sound, preload_sounds
+from modestmoviemetadata.tools.completionindex import complete_title
 from modestmoviemetadata.tools.database import (
+    QueryCancelled,
+    TitleScope,
     create_title_index,
     database_exists,
     dataset_downward_size,
     download_and_convert,
     title_index_exists,
+    warm_up_caches,
 )
 from modestmoviemetadata.tools.filetools import program_appdata_directory
 from modestmoviemetadata.tools.logtools import get_logger
 from modestmoviemetadata.tools.movieinfo import (
     MovieInfo,
     fetch_movie_info,
+    fetch_movie_infos,
     get_imdb,
-    sanitise_title,
+    get_imdb_ids,
+    jellyfin_folder_name,
+    search_movie_info,
+    title_search_needs_title_index,
 )
+from modestmoviemetadata.tools.queryservice import answer_request
+from modestmoviemetadata.tools.titlestore import load_title_store
 from modestmoviemetadata.tools.utilities import (
     format_bytes,
     program_icon_path,
@@ -45,7 +66,15 @@ from modestmoviemetadata.tools.utilities import (
 )
 from modestmoviemetadata.tools.viewutils import boxBorderColor
 from modestmoviemetadata.ui.aboutdialog import AboutDialog
-from modestmoviemetadata.ui.appthreading import Worker
+from modestmoviemetadata.ui.appthreading import (
+    PRIORITY_LOOKUP,
+    PRIORITY_SEARCH,
+    CancellableWorker,
+    Lane,
+    Scheduler,
+    StreamingWorker,
+    Worker,
+)
 from modestmoviemetadata.ui.fancylineedit import FancyLineEdit
 from modestmoviemetadata.ui.narrowspinbox import NarrowSpinbox
 from modestmoviemetadata.ui.selectrecord import SelectRecord
@@ -60,6 +89,25 @@ class PendingOperation(Flag):
 
 
 IMDB_YEAR_MIN = 1894
+# Default maximum number of seconds a title search may run
+TITLE_SEARCH_TIME_BUDGET = 60
+
+# Sounds the program plays, and the number of milliseconds after startup to wait
+# before preloading them
+SOUNDS = ("choh.mp3", "brrr.mp3", "error.mp3")
+SOUND_PRELOAD_DELAY = 2000
+
+# Number of milliseconds to wait for clipboard changes to stop before scanning the
+# clipboard for IMDb ids
+CLIPBOARD_DEBOUNCE_DELAY = 150
+
+# Number of milliseconds after startup to wait before loading the title store, if
+# titles are kept in memory
+TITLE_STORE_LOAD_DELAY = 3000
+
+# Number of milliseconds after startup to wait before warming the caches the first
+# lookup reads, which leaves time for the window to be displayed
+CACHE_WARM_UP_DELAY = 500
 
 
 class MainWindow(QMainWindow):
@@ -74,17 +122,33 @@ class MainWindow(QMainWindow):
 
         self.settings = QSettings()
 
-        self.threadpool = QThreadPool()
-        self.threadpool.setMaxThreadCount(1)
+        self.scheduler = Scheduler(self)
 
         self.clipboard = QGuiApplication.clipboard()
         self.clipboard.changed.connect(self.clipboardDataChanged)
+        # Applications often change the clipboard several times in quick succession
+        self.clipboardTimer = QTimer(self)
+        self.clipboardTimer.setSingleShot(True)
+        self.clipboardTimer.setInterval(CLIPBOARD_DEBOUNCE_DELAY)
+        self.clipboardTimer.timeout.connect(self.scanClipboard)
+        # The lookup of several IMDb ids found in the clipboard, if any
+        self.clipboardLookupWorker: Worker | None = None
 
         self.folderIconLabel = QLabel()
 
         # Initialize pending operation flag to no flag
         self.pending_operation = PendingOperation(0)
 
+        # The title search currently running, if any
+        self.titleSearchWorker: StreamingWorker | None = None
+        self.titleSearchResults: list[MovieInfo] = []
+        # Titles the running title search has found so far, shown as they are found
+        self.titleSearchSelectRecord: SelectRecord | None = None
+        # The dataset download or title index creation currently running, if any
+        self.maintenanceWorker: CancellableWorker | None = None
+        self.titleSearchFound = 0
+        self.titleSearchingFor = ""
+
         pixmap = QPixmap(video_folder_path())
         self.folderIconLabel.setPixmap(pixmap)
         self.folderIconLabel.setScaledContents(True)
@@ -96,6 +160,16 @@ class MainWindow(QMainWindow):
         self.titleLabel = QLabel("&Title")
         self.titleLabel.setBuddy(self.titleEdit)
 
+        # Completions are looked up in a memory-mapped index as the title is typed,
+        # so the model holds only the completions of the current text
+        self.titleCompletionModel = QStringListModel(self)
+        self.titleCompleter = QCompleter(self.titleCompletionModel, self)
+        self.titleCompleter.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion
+        )
+        self.titleCompleter.setWidget(self.titleEdit)
+        self.titleCompleter.activated[str].connect(self.titleCompletionActivated)
+
         self.yearSpinbox = NarrowSpinbox()
         self.yearSpinbox.setRange(IMDB_YEAR_MIN - 1, 2100)
         self.yearSpinbox.setSpecialValueText("")
@@ -103,11 +177,31 @@ class MainWindow(QMainWindow):
         self.yearLabel = QLabel("&Year")
         self.yearLabel.setBuddy(self.yearSpinbox)
 
+        self.scopeCombobox = QComboBox()
+        for text, scope in (
+            ("All", TitleScope.ALL),
+            ("Movies", TitleScope.MOVIES),
+            ("Series", TitleScope.SERIES),
+        ):
+            self.scopeCombobox.addItem(text, scope.value)
+        self.scopeCombobox.setToolTip("The kinds of title a search by title finds")
+        index = self.scopeCombobox.findData(
+            self.settings.value("Title_Search_Scope", TitleScope.ALL.value)
+        )
+        self.scopeCombobox.setCurrentIndex(max(index, 0))
+        self.scopeLabel = QLabel("T&ype")
+        self.scopeLabel.setBuddy(self.scopeCombobox)
+
         self.imdbEdit = FancyLineEdit()
         self.imdbLabel = QLabel("&IMDb")
         self.imdbLabel.setBuddy(self.imdbEdit)
 
-        for label in (self.titleLabel, self.yearLabel, self.imdbLabel):
+        for label in (
+            self.titleLabel,
+            self.yearLabel,
+            self.scopeLabel,
+            self.imdbLabel,
+        ):
             label.setStyleSheet(
                 f"""
                 font-weight: bold;
@@ -121,7 +215,13 @@ class MainWindow(QMainWindow):
         font = QFont()
         font.setItalic(True)
         self.lastUpdatedLabel.setFont(font)
-        self.showLastUpdated()
+        # Show when the dataset was last updated once the window is first displayed,
+        # because doing so requires importing arrow, which is slow
+        QTimer.singleShot(0, self.showLastUpdated)
+        QTimer.singleShot(CACHE_WARM_UP_DELAY, self.warmUpCaches)
+        QTimer.singleShot(SOUND_PRELOAD_DELAY, self.preloadSounds)
+        if self.keepTitlesInMemory():
+            QTimer.singleShot(TITLE_STORE_LOAD_DELAY, self.loadTitleStore)
 
         self.lastUpdatedTimer = QTimer()
         # Update last updated every 60 minutes
@@ -132,6 +232,7 @@ class MainWindow(QMainWindow):
         self.titleEdit.textEdited.connect(self.titleEditTextEdited)
         self.titleEdit.pasted.connect(self.titleEditPasted)
         self.yearSpinbox.valueChanged.connect(self.yearSpinboxValueChanged)
+        self.scopeCombobox.currentIndexChanged.connect(self.scopeComboboxIndexChanged)
         self.imdbEdit.textEdited.connect(self.imdbEditTextEdited)
         self.imdbEdit.pasted.connect(self.imdbEditPasted)
 
@@ -159,11 +260,13 @@ class MainWindow(QMainWindow):
         gridLayout = QGridLayout()
         gridLayout.addWidget(self.titleLabel, 0, 0)
         gridLayout.addWidget(self.yearLabel, 0, 1)
+        gridLayout.addWidget(self.scopeLabel, 0, 2)
         gridLayout.addWidget(self.titleEdit, 1, 0)
         gridLayout.addWidget(self.yearSpinbox, 1, 1)
+        gridLayout.addWidget(self.scopeCombobox, 1, 2)
         gridLayout.addWidget(self.imdbLabel, 2, 0)
-        gridLayout.addWidget(self.imdbEdit, 3, 0, 1, 2)
-        gridLayout.addWidget(self.lastUpdatedLabel, 4, 0, 1, 2)
+        gridLayout.addWidget(self.imdbEdit, 3, 0, 1, 3)
+        gridLayout.addWidget(self.lastUpdatedLabel, 4, 0, 1, 3)
         gridLayout.setSpacing(6)
 
         layout = QVBoxLayout()
@@ -229,16 +332,57 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def clipboardDataChanged(self) -> None:
-        text = get_imdb(self.clipboard.text())
-        if text and text != self.imdbEdit.text():
-            logger.debug("IMDb id %s detected in clipboard", text)
-            self.resetButtonClicked(False)
-            self.imdbEdit.setText(text)
+        self.clipboardTimer.start()
+
+    @Slot()
+    def scanClipboard(self) -> None:
+        imdb_ids = get_imdb_ids(self.clipboard.text())
+        if not imdb_ids or imdb_ids == [self.imdbEdit.text()]:
+            return
+
+        self.cancelTitleSearch()
+        self.resetButtonClicked(False)
+        if len(imdb_ids) == 1:
+            logger.debug("IMDb id %s detected in clipboard", imdb_ids[0])
+            self.clipboardLookupWorker = None
+            self.imdbEdit.setText(imdb_ids[0])
             self.getButtonClicked(False)
+        else:
+            logger.debug("%s IMDb ids detected in clipboard", len(imdb_ids))
+            worker = Worker(fetch_movie_infos, imdb_ids)
+            worker.signals.result.connect(self.clipboardLookupFinished)
+            worker.signals.error.connect(self.movieInfoException)
+            self.clipboardLookupWorker = worker
+            self.scheduler.start(worker, priority=PRIORITY_LOOKUP, key="lookup")
+
+    @Slot(object)
+    def clipboardLookupFinished(self, movie_infos: list[MovieInfo]) -> None:
+        # Ignore the results of a lookup superseded by a later clipboard change
+        if (
+            self.clipboardLookupWorker is None
+            or self.sender() is not self.clipboardLookupWorker.signals
+        ):
+            return
+        self.clipboardLookupWorker = None
+        self.movieInfoExtracted(movie_infos)
 
     @Slot(str)
     def titleEditTextEdited(self, text: str) -> None:
         self.generateOutput()
+        self.completeTitle(text)
+
+    def completeTitle(self, text: str) -> None:
+        completions = complete_title(text.lstrip())
+        self.titleCompletionModel.setStringList(completions)
+        if completions:
+            self.titleCompleter.complete()
+        else:
+            self.titleCompleter.popup().hide()
+
+    @Slot(str)
+    def titleCompletionActivated(self, text: str) -> None:
+        self.titleEdit.setText(text)
+        self.generateOutput()
 
     @Slot()
     def titleEditPasted(self) -> None:
@@ -258,6 +402,13 @@ class MainWindow(QMainWindow):
     def yearSpinboxValueChanged(self, value: int) -> None:
         self.generateOutput()
 
+    @Slot(int)
+    def scopeComboboxIndexChanged(self, index: int) -> None:
+        self.settings.setValue("Title_Search_Scope", self.scopeCombobox.currentData())
+
+    def titleSearchScope(self) -> TitleScope:
+        return TitleScope(self.scopeCombobox.currentData())
+
     @Slot(str)
     def imdbEditTextEdited(self, text: str) -> None:
         ic(text)
@@ -274,10 +425,9 @@ class MainWindow(QMainWindow):
             self.folderLabel.clear()
             return
 
-        text = f"{sanitise_title(title)} ({year})"
-        if self.imdbEdit.text():
-            text = f"{text} [imdbid-{self.imdbEdit.text()}]"
-        self.folderLabel.setText(text)
+        self.folderLabel.setText(
+            jellyfin_folder_name(title, year, self.imdbEdit.text())
+        )
 
     @Slot()
     def aboutButtonClicked(self, checked: bool) -> None:
@@ -308,19 +458,36 @@ class MainWindow(QMainWindow):
     def downloadButtonClicked(self, checked: bool) -> None:
 
         self.progressDialog = QProgressDialog(
-            "Checking IMDb dataset...", None, 0, 0, self
+            "Checking IMDb dataset...", "Cancel", 0, 0, self
         )
         self.progressDialog.setMinimumDuration(0)
         self.progressDialog.setValue(0)
         self.progressDialog.setWindowModality(Qt.WindowModality.WindowModal)
         self.progressDialog.setAutoReset(False)
+        self.progressDialog.canceled.connect(self.cancelMaintenance)
 
-        worker = Worker(download_and_convert, self.settings.value("Last_Modified", ""))
+        worker = CancellableWorker(
+            download_and_convert,
+            self.settings.value("Last_Modified", ""),
+            title_index=self.buildTitleIndex(),
+        )
         worker.signals.result.connect(self.downloadResult)
         worker.signals.finished.connect(self.downloadComplete)
         worker.signals.progress.connect(self.downloadProgress)
         worker.signals.error.connect(self.downloadException)
-        self.threadpool.start(worker)
+        worker.signals.cancelled.connect(self.downloadCancelled)
+        self.maintenanceWorker = worker
+        self.scheduler.start(worker, Lane.MAINTENANCE)
+
+    def buildTitleIndex(self) -> bool:
+        return self.settings.value("Build_Title_Index", False, type=bool)
+
+    @Slot()
+    def cancelMaintenance(self) -> None:
+        if self.maintenanceWorker is not None:
+            logger.debug("Cancelling database maintenance")
+            self.maintenanceWorker.cancel()
+            self.maintenanceWorker = None
 
     @Slot(tuple)
     def downloadProgress(self, data: tuple) -> None:
@@ -346,10 +513,13 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def downloadComplete(self) -> None:
+        self.maintenanceWorker = None
         if PendingOperation.INFORM_DATASET_CONVERTED in self.pending_operation:
             self.playSound("choh.mp3")
             # Remove the flag
             self.pending_operation &= ~PendingOperation.INFORM_DATASET_CONVERTED
+            if self.keepTitlesInMemory():
+                self.loadTitleStore()
 
         self.progressDialog.reset()
         self.showLastUpdated()
@@ -364,6 +534,14 @@ class MainWindow(QMainWindow):
         if not database_exists():
             QTimer.singleShot(0, self.datasetRequired)
 
+    @Slot()
+    def downloadCancelled(self) -> None:
+        logger.debug("Dataset update cancelled")
+        if PendingOperation.IMDB_ID_SEARCH in self.pending_operation:
+            self.pending_operation &= ~PendingOperation.IMDB_ID_SEARCH
+        if not database_exists():
+            QTimer.singleShot(0, self.datasetRequired)
+
     @Slot()
     def showLastUpdated(self) -> None:
         last_modified = cast(str, self.settings.value("Last_Modified", ""))
@@ -378,6 +556,8 @@ class MainWindow(QMainWindow):
                 )
                 self.lastUpdatedLabel.setText("")
             else:
+                import arrow
+
                 last_modified = arrow.get(last_modified_dt).humanize()
                 self.lastUpdatedLabel.setText(
                     f"Using IMDb's dataset released {last_modified}"
@@ -390,7 +570,12 @@ class MainWindow(QMainWindow):
             )
             return True
 
-        if not title_index_exists():
+        # Only ranked searches of the database that neither are scoped nor scan the
+        # titles table in parallel read the title index
+        if (
+            title_search_needs_title_index(self.titleSearchScope())
+            and not title_index_exists()
+        ):
             key = "Title_Index_Message"
             if not self.settings.value(key, ""):
                 logger.debug("Prompting whether to add primary title index")
@@ -417,34 +602,49 @@ class MainWindow(QMainWindow):
                     logger.debug("User cancelled index creation")
                     return False
                 if ret == QMessageBox.StandardButton.Yes:
+                    # Build the title index whenever the dataset is updated too
+                    self.settings.setValue("Build_Title_Index", True)
                     self.progressDialog = QProgressDialog(
-                        "Optimizing Database...", None, 0, 0, self
+                        "Optimizing Database...", "Cancel", 0, 0, self
                     )
                     self.progressDialog.setMinimumDuration(0)
                     self.progressDialog.setValue(0)
                     self.progressDialog.setWindowModality(Qt.WindowModality.WindowModal)
                     self.progressDialog.setAutoReset(False)
+                    self.progressDialog.canceled.connect(self.cancelMaintenance)
 
-                    worker = Worker(create_title_index)
-                    worker.signals.finished.connect(self.titleIndexCreationFinished)
+                    worker = CancellableWorker(create_title_index)
+                    worker.signals.result.connect(self.titleIndexCreationFinished)
                     worker.signals.error.connect(self.titleIndexCreationException)
+                    worker.signals.progress.connect(self.downloadProgress)
+                    worker.signals.cancelled.connect(self.titleIndexCreationCancelled)
+                    self.maintenanceWorker = worker
                     # Set the flag to indicate a title search needs to be done
                     # after the index is created
                     self.pending_operation |= PendingOperation.TITLE_SEARCH
-                    self.threadpool.start(worker)
+                    self.scheduler.start(worker, Lane.MAINTENANCE)
                     return False
 
         self.pending_operation |= PendingOperation.TITLE_SEARCH
         return True
 
-    @Slot()
-    def titleIndexCreationFinished(self) -> None:
+    @Slot(object)
+    def titleIndexCreationFinished(self, data: object) -> None:
+        self.maintenanceWorker = None
         QTimer.singleShot(0, self.getButton.clicked.emit)
         self.progressDialog.reset()
 
     @Slot(Exception)
     def titleIndexCreationException(self, exception: Exception) -> None:
         logger.error(str(exception))
+        self.maintenanceWorker = None
+        if PendingOperation.TITLE_SEARCH in self.pending_operation:
+            self.pending_operation &= ~PendingOperation.TITLE_SEARCH
+        self.progressDialog.reset()
+
+    @Slot()
+    def titleIndexCreationCancelled(self) -> None:
+        logger.debug("Title index creation cancelled")
         if PendingOperation.TITLE_SEARCH in self.pending_operation:
             self.pending_operation &= ~PendingOperation.TITLE_SEARCH
         self.progressDialog.reset()
@@ -468,14 +668,33 @@ class MainWindow(QMainWindow):
                     logger.debug("Not searching by title")
                 return
 
-            searching_for = f"{title} ({year})" if year is not None else title
+            self.titleSearchingFor = f"{title} ({year})" if year is not None else title
+            self.titleSearchFound = 0
+            self.titleSearchResults = []
             self.progressDialog = QProgressDialog(
-                f"Searching for {searching_for}...", None, 0, 0, self
+                f"Searching for {self.titleSearchingFor}...", "Cancel", 0, 0, self
             )
             self.progressDialog.setMinimumDuration(0)
             self.progressDialog.setValue(0)
             self.progressDialog.setWindowModality(Qt.WindowModality.WindowModal)
             self.progressDialog.setAutoReset(False)
+            self.progressDialog.canceled.connect(self.cancelTitleSearch)
+
+            logger.debug("Searching by title %s (%s)", title, year)
+            worker = StreamingWorker(
+                search_movie_info,
+                title,
+                year,
+                time_budget=self.titleSearchTimeBudget(),
+                scope=self.titleSearchScope(),
+            )
+            worker.signals.result.connect(self.titleSearchFinished)
+            worker.signals.error.connect(self.movieInfoException)
+            worker.signals.partial.connect(self.movieInfoPartial)
+            worker.signals.cancelled.connect(self.titleSearchCancelled)
+            self.titleSearchWorker = worker
+            self.scheduler.start(worker, priority=PRIORITY_SEARCH, key="title_search")
+            return
 
         if not title:
             if len(imdb_id) < 2:
@@ -485,10 +704,108 @@ class MainWindow(QMainWindow):
                 return
 
         logger.debug("Fetching movie info %s (%s) %s", title, year, imdb_id)
-        worker = Worker(fetch_movie_info, title, year, imdb_id)
+        worker = Worker(
+            fetch_movie_info, title, year, imdb_id, scope=self.titleSearchScope()
+        )
         worker.signals.result.connect(self.movieInfoExtracted)
         worker.signals.error.connect(self.movieInfoException)
-        self.threadpool.start(worker)
+        self.scheduler.start(worker, priority=PRIORITY_LOOKUP, key="lookup")
+
+    def titleSearchTimeBudget(self) -> float:
+        key = "Title_Search_Time_Budget"
+        try:
+            return float(self.settings.value(key, TITLE_SEARCH_TIME_BUDGET))
+        except (TypeError, ValueError):
+            logger.error("Invalid title search time budget")
+            return TITLE_SEARCH_TIME_BUDGET
+
+    @Slot()
+    def cancelTitleSearch(self) -> None:
+        if self.titleSearchWorker is None:
+            return
+        logger.debug("Cancelling search for %s", self.titleSearchingFor)
+        self.titleSearchWorker.cancel()
+        self.titleSearchWorker = None
+        self.titleSearchResults = []
+        if PendingOperation.TITLE_SEARCH in self.pending_operation:
+            self.progressDialog.reset()
+            # Unset the Title Search flag
+            self.pending_operation &= ~PendingOperation.TITLE_SEARCH
+
+    def isCurrentTitleSearch(self) -> bool:
+        """
+        :return: True if the signal being handled was emitted by the title search
+         currently running, and not by one that was since cancelled
+        """
+
+        return (
+            self.titleSearchWorker is not None
+            and self.sender() is self.titleSearchWorker.signals
+        )
+
+    @Slot(object)
+    def movieInfoPartial(self, movie_infos: list[MovieInfo]) -> None:
+        if not self.isCurrentTitleSearch():
+            return
+        self.titleSearchFound += len(movie_infos)
+        if self.titleSearchSelectRecord is not None:
+            self.titleSearchSelectRecord.addMovieInfos(movie_infos)
+            return
+        self.titleSearchResults.extend(movie_infos)
+        if len(self.titleSearchResults) > 1:
+            # The user chooses from the titles found so far while the search
+            # continues. A single title found is used without asking, once the
+            # search finishes without finding others.
+            self.showTitleSearchResults()
+        else:
+            self.progressDialog.setLabelText(
+                f"Searching for {self.titleSearchingFor}...\n"
+                f"{QLocale.system().toString(self.titleSearchFound)} found"
+            )
+
+    def showTitleSearchResults(self) -> None:
+        self.progressDialog.reset()
+        self.playSound("brrr.mp3")
+        selectRecord = SelectRecord(
+            movie_infos=self.titleSearchResults,
+            parent=self,
+            searching_for=self.titleSearchingFor,
+        )
+        self.titleSearchResults = []
+        selectRecord.finished.connect(self.titleSearchSelectRecordFinished)
+        self.titleSearchSelectRecord = selectRecord
+        selectRecord.open()
+
+    @Slot(int)
+    def titleSearchSelectRecordFinished(self, result: int) -> None:
+        selectRecord = self.titleSearchSelectRecord
+        if selectRecord is None:
+            return
+        self.titleSearchSelectRecord = None
+        # The user need not wait for the search to finish before choosing a title
+        self.cancelTitleSearch()
+        movie_info = selectRecord.movieInfo()
+        selectRecord.deleteLater()
+        if result and movie_info is not None:
+            self.useMovieInfo(movie_info)
+
+    @Slot(object)
+    def titleSearchFinished(self, found: int) -> None:
+        if not self.isCurrentTitleSearch():
+            return
+        logger.debug("Title search found %s titles", found)
+        if self.titleSearchSelectRecord is not None:
+            self.titleSearchSelectRecord.searchFinished()
+            self.titleSearchWorker = None
+            self.pending_operation &= ~PendingOperation.TITLE_SEARCH
+            return
+        movie_infos = self.titleSearchResults
+        self.titleSearchResults = []
+        self.movieInfoExtracted(movie_infos)
+
+    @Slot()
+    def titleSearchCancelled(self) -> None:
+        logger.debug("Title search cancelled")
 
     @Slot(object)
     def movieInfoExtracted(self, movie_infos: list[MovieInfo | None]) -> None:
@@ -497,6 +814,7 @@ class MainWindow(QMainWindow):
             self.progressDialog.reset()
             # Unset the Title Search flag
             self.pending_operation &= ~PendingOperation.TITLE_SEARCH
+            self.titleSearchWorker = None
 
         movie_info = None
 
@@ -533,10 +851,13 @@ class MainWindow(QMainWindow):
                 movie_info = movie_infos[selectRecord.row]
 
         if movie_info is not None:
-            logger.debug("%s (%s)", movie_info.title, movie_info.year)
-            self.setMovieInfo(movie_info)
-            self.generateOutput()
-            QTimer.singleShot(0, self.copyButton.clicked.emit)
+            self.useMovieInfo(movie_info)
+
+    def useMovieInfo(self, movie_info: MovieInfo) -> None:
+        logger.debug("%s (%s)", movie_info.title, movie_info.year)
+        self.setMovieInfo(movie_info)
+        self.generateOutput()
+        QTimer.singleShot(0, self.copyButton.clicked.emit)
 
     def setMovieInfo(self, movieInfo: MovieInfo) -> None:
         if movieInfo.title:
@@ -557,32 +878,80 @@ class MainWindow(QMainWindow):
 
     @Slot(Exception)
     def movieInfoException(self, exception: Exception) -> None:
-        logger.debug("Error getting movie information")
-        logger.error("%s: %s", exception.__class__.__name__, str(exception))
-        self.playSound("error.mp3")
+        if isinstance(exception, QueryCancelled):
+            logger.debug("Search cancelled because the database is being replaced")
+        else:
+            logger.debug("Error getting movie information")
+            logger.error("%s: %s", exception.__class__.__name__, str(exception))
+            self.playSound("error.mp3")
+        if self.titleSearchSelectRecord is not None and self.isCurrentTitleSearch():
+            # Titles found before the error remain available to choose from
+            self.titleSearchSelectRecord.searchFinished()
         if PendingOperation.TITLE_SEARCH in self.pending_operation:
             self.progressDialog.reset()
             # Unset the Title Search flag
             self.pending_operation &= ~PendingOperation.TITLE_SEARCH
+            self.titleSearchWorker = None
 
     @Slot(str)
     def playSound(self, sound: str) -> None:
         logger.debug("Using Qt to play audio")
         play_sound(soundfile=sound)
 
+    def queryServiceRequest(self, request: dict, reply: Callable[[dict], None]) -> None:
+        """
+        Answer a request from a client of the local query service
+        """
+
+        worker = Worker(answer_request, request)
+        worker.signals.result.connect(reply)
+        self.scheduler.start(worker, priority=PRIORITY_LOOKUP)
+
+    @Slot()
+    def preloadSounds(self) -> None:
+        preload_sounds(SOUNDS)
+
+    @Slot()
+    def warmUpCaches(self) -> None:
+        if not database_exists():
+            return
+        worker = CancellableWorker(warm_up_caches)
+        worker.signals.error.connect(self.warmUpException)
+        # Cancelled when a lookup or search starts
+        self.scheduler.start(worker, Lane.IDLE)
+
+    @Slot(Exception)
+    def warmUpException(self, exception: Exception) -> None:
+        logger.warning("Unable to warm up caches: %s", exception)
+
+    def keepTitlesInMemory(self) -> bool:
+        return self.settings.value("Keep_Titles_In_Memory", False, type=bool)
+
+    @Slot()
+    def loadTitleStore(self) -> None:
+        if not database_exists():
+            return
+        worker = CancellableWorker(load_title_store)
+        worker.signals.error.connect(self.titleStoreException)
+        self.scheduler.start(worker, Lane.MAINTENANCE, key="title_store")
+
+    @Slot(Exception)
+    def titleStoreException(self, exception: Exception) -> None:
+        logger.error("Unable to load titles into memory: %s", exception)
+
     def datasetRequired(self) -> None:
         worker = Worker(dataset_downward_size)
         worker.signals.result.connect(self.datasetRequiredSize)
-        self.threadpool.start(worker)
+        self.scheduler.start(worker, Lane.MAINTENANCE)
 
     @Slot(object)
     def datasetRequiredSize(self, data: object) -> None:
         size = int(data)
         s = f"{format_bytes(size)} " if size > 0 else ""
 
-        ret = QMessageBox.question(
-            self,
-            "Database Required",
+        msgBox = QMessageBox(parent=self)
+        msgBox.setWindowTitle("Database Required")
+        msgBox.setText(
             "To continue this program will download from IMDb a publicly "
             f"available {s}dataset.\n\n"
             "The dataset will then be converted into a database about 1 GB in "
@@ -590,8 +959,17 @@ class MainWindow(QMainWindow):
             "Without this database, the program is unable to function.\n\n"
             "Do you want this program to proceed with the download and conversion?",
         )
+        msgBox.setIcon(QMessageBox.Icon.Question)
+        msgBox.setStandardButtons(
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        cb = QCheckBox("Also optimize the database for searching by title")
+        cb.setChecked(self.buildTitleIndex())
+        msgBox.setCheckBox(cb)
+        ret = msgBox.exec()
         if ret == QMessageBox.StandardButton.No:
             self.close()
+        self.settings.setValue("Build_Title_Index", cb.isChecked())
         QTimer.singleShot(0, self.downloadButton.clicked.emit)
 
     @Slot(Exception)
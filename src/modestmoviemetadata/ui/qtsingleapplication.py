@@ -1,40 +1,61 @@
 #  SPDX-FileCopyrightText: 2016-2026 Damon Lynch <damonlynch@gmail.com>
 #  SPDX-License-Identifier: GPL-3.0-or-later
 
-from qtpy.QtCore import Qt, QTextStream, Signal
+import itertools
+from collections.abc import Callable
+
+from qtpy.QtCore import Qt, Signal, Slot
 from qtpy.QtNetwork import QLocalServer, QLocalSocket
 from qtpy.QtWidgets import QApplication
 
+from modestmoviemetadata.tools.logtools import get_logger
+from modestmoviemetadata.tools.queryservice import (
+    ACTIVATE,
+    MAX_REQUEST_SIZE,
+    RequestError,
+    decode_message,
+    encode_message,
+)
+
 """
 Based on a modified version of the QtSingleApplication class from
 https://stackoverflow.com/a/12712362/21247765.
+
+The local server also serves the local query service: see tools/queryservice.py
+for its protocol.
 """
 
+logger = get_logger()
+
 
 class QtSingleApplication(QApplication):
     messageReceived = Signal(str)
+    # Emitted with a connection number and the response to send to it. Responses
+    # are produced in worker threads, but must be written in the main thread.
+    _responseReady = Signal(int, object)
 
     def __init__(self, id, *argv):
         super().__init__(*argv)
         self._id = id
         self._activationWindow = None
         self._activateOnMessage = False
+        self._requestHandler: Callable[[dict, Callable[[dict], None]], None] | None
+        self._requestHandler = None
+        self._responseReady.connect(self._reply)
 
         # Is there another instance running?
         self._outSocket = QLocalSocket()
         self._outSocket.connectToServer(self._id)
         self._isRunning = self._outSocket.waitForConnected()
 
-        if self._isRunning:
-            # Yes, there is.
-            self._outStream = QTextStream(self._outSocket)
-            self._outStream.setCodec("UTF-8")
-        else:
+        if not self._isRunning:
             # No, there isn't.
             self._outSocket = None
-            self._outStream = None
-            self._inSocket = None
-            self._inStream = None
+            # Connected clients, by connection number
+            self._inSockets: dict[int, QLocalSocket] = {}
+            self._connectionNumbers = itertools.count()
+            # Remove the socket file left behind if a previous instance crashed
+            QLocalServer.removeServer(self._id)
             self._server = QLocalServer()
             self._server.listen(self._id)
             self._server.newConnection.connect(self._onNewConnection)
@@ -52,6 +73,16 @@ class QtSingleApplication(QApplication):
         self._activationWindow = activationWindow
         self._activateOnMessage = activateOnMessage
 
+    def setRequestHandler(
+        self, handler: Callable[[dict, Callable[[dict], None]], None]
+    ) -> None:
+        """
+        :param handler: called with each query service request and a function with
+         which to send its response, which may be called from any thread
+        """
+
+        self._requestHandler = handler
+
     def activateWindow(self):
         if not self._activationWindow:
             return
@@ -62,27 +93,67 @@ class QtSingleApplication(QApplication):
         self._activationWindow.activateWindow()
 
     def sendMessage(self, msg):
-        if not self._outStream:
+        if not self._outSocket:
             return False
-        self._outStream << msg << "\n"
-        self._outStream.flush()
+        self._outSocket.write(msg.encode("utf-8") + b"\n")
         return self._outSocket.waitForBytesWritten()
 
+    def sendActivate(self):
+        return self.sendMessage(encode_message({"method": ACTIVATE}).decode("utf-8"))
+
     def _onNewConnection(self):
-        if self._inSocket:
-            self._inSocket.readyRead.disconnect(self._onReadyRead)
-        self._inSocket = self._server.nextPendingConnection()
-        if not self._inSocket:
+        while self._server.hasPendingConnections():
+            socket = self._server.nextPendingConnection()
+            number = next(self._connectionNumbers)
+            self._inSockets[number] = socket
+            socket.readyRead.connect(lambda number=number: self._onReadyRead(number))
+            socket.disconnected.connect(
+                lambda number=number: self._onDisconnected(number)
+            )
+
+    def _onDisconnected(self, number: int) -> None:
+        socket = self._inSockets.pop(number, None)
+        if socket is not None:
+            socket.deleteLater()
+
+    def _onReadyRead(self, number: int) -> None:
+        socket = self._inSockets.get(number)
+        if socket is None:
+            return
+        while socket.canReadLine():
+            line = bytes(socket.readLine()).rstrip(b"\r\n")
+            if line:
+                self._handleLine(number, line)
+        if socket.bytesAvailable() > MAX_REQUEST_SIZE:
+            logger.warning("Closing query service connection: request too long")
+            socket.abort()
+
+    def _handleLine(self, number: int, line: bytes) -> None:
+        if not line.startswith(b"{"):
+            self.messageReceived.emit(line.decode("utf-8", errors="replace"))
+            return
+
+        try:
+            request = decode_message(line)
+        except RequestError as e:
+            self._reply(number, {"id": None, "error": str(e)})
             return
-        self._inStream = QTextStream(self._inSocket)
-        self._inStream.setCodec("UTF-8")
-        self._inSocket.readyRead.connect(self._onReadyRead)
-        if self._activateOnMessage:
-            self.activateWindow()
-
-    def _onReadyRead(self):
-        while True:
-            msg = self._inStream.readLine()
-            if not msg:
-                break
-            self.messageReceived.emit(msg)
+
+        if request.get("method") == ACTIVATE:
+            if self._activateOnMessage:
+                self.activateWindow()
+        elif self._requestHandler is None:
+            self._reply(
+                number, {"id": request.get("id"), "error": "Service not available"}
+            )
+        else:
+            self._requestHandler(
+                request, lambda response: self._responseReady.emit(number, response)
+            )
+
+    @Slot(int, object)
+    def _reply(self, number: int, response: dict) -> None:
+        # The client may have disconnected while its request was being answered
+        socket = self._inSockets.get(number)
+        if socket is not None:
+            socket.write(encode_message(response))
@@ -6,6 +6,7 @@ from typing import Any
 
 from qtpy.QtCore import (
     QAbstractTableModel,
+    QLocale,
     QModelIndex,
     Qt,
     Signal,
@@ -17,6 +18,7 @@ from qtpy.QtGui import (
 from qtpy.QtWidgets import (
     QDialog,
     QDialogButtonBox,
+    QLabel,
     QMainWindow,
     QStyle,
     QTableView,
@@ -27,8 +29,24 @@ from modestmoviemetadata.tools.movieinfo import MovieInfo, make_imdb_url
 
 
 class SelectRecord(QDialog):
-    def __init__(self, movie_infos: list[MovieInfo], parent: QMainWindow) -> None:
+    """
+    Let the user choose one of several titles. When showing the results of a search
+    that is still running, titles are added as they are found.
+    """
+
+    def __init__(
+        self,
+        movie_infos: list[MovieInfo],
+        parent: QMainWindow,
+        searching_for: str = "",
+    ) -> None:
+        """
+        :param searching_for: if given, the search is still running, and this is
+         what it is searching for
+        """
+
         super().__init__(parent)
+        self.searching_for = searching_for
         self.model = MoviesModel(movie_infos=movie_infos, parent=self)
         self.table = MoviesTable(parent=self)
         self.table.setModel(self.model)
@@ -38,8 +56,13 @@ class SelectRecord(QDialog):
         self.buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
         self.buttonBox.rejected.connect(self.reject)
 
+        self.statusLabel = QLabel()
+        self.statusLabel.setVisible(bool(searching_for))
+        self.showStatus()
+
         layout = QVBoxLayout()
         layout.addWidget(self.table)
+        layout.addWidget(self.statusLabel)
         layout.addWidget(self.buttonBox)
         self.setLayout(layout)
         self.row = None
@@ -60,6 +83,32 @@ class SelectRecord(QDialog):
         self.row = row
         self.accept()
 
+    def movieInfo(self) -> MovieInfo | None:
+        """
+        :return: the title the user chose, if any
+        """
+
+        if self.row is None:
+            return None
+        return self.model.movie_infos[self.row]
+
+    def addMovieInfos(self, movie_infos: list[MovieInfo]) -> None:
+        self.model.addMovieInfos(movie_infos)
+        self.showStatus()
+
+    def searchFinished(self) -> None:
+        self.searching_for = ""
+        self.showStatus()
+
+    def showStatus(self) -> None:
+        found = QLocale.system().toString(self.model.rowCount())
+        if self.searching_for:
+            self.statusLabel.setText(
+                f"Searching for {self.searching_for}... {found} found"
+            )
+        else:
+            self.statusLabel.setText(f"{found} found")
+
 
 class MoviesModel(QAbstractTableModel):
     def __init__(self, movie_infos: list[MovieInfo], parent: SelectRecord) -> None:
@@ -72,6 +121,14 @@ class MoviesModel(QAbstractTableModel):
         for i, value in enumerate(self.header_labels):
             self.setHeaderData(i, Qt.Orientation.Horizontal, value)
 
+    def addMovieInfos(self, movie_infos: list[MovieInfo]) -> None:
+        if not movie_infos:
+            return
+        first = len(self.movie_infos)
+        self.beginInsertRows(QModelIndex(), first, first + len(movie_infos) - 1)
+        self.movie_infos.extend(movie_infos)
+        self.endInsertRows()
+
     def rowCount(self, parent: QModelIndex | None = None) -> int:
         return len(self.movie_infos)
 
@@ -0,0 +1,110 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+# Compare the speed of the decompression backends available on this machine, by
+# reading the IMDb dataset in the same way the import does. Checks that every
+# backend produces the same number of lines and bytes.
+#
+#   python tools/decompress_benchmark.py title.basics.tsv.gz
+#   python tools/decompress_benchmark.py --download
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from modestmoviemetadata.config import imdb_dataset_url
+from modestmoviemetadata.tools.decompress import available_backends, open_dataset
+
+# Size of the reads, the same as the import's
+READ_SIZE = 1 << 20
+
+
+def read_dataset(path: Path, backend: str) -> tuple[float, int, int]:
+    """
+    :return: seconds taken to read the dataset, and its number of lines and bytes
+    """
+
+    lines = 0
+    size = 0
+    start = time.perf_counter()
+    with open_dataset(path, backend) as f:
+        while chunk := f.read(READ_SIZE):
+            lines += chunk.count(b"\n")
+            size += len(chunk)
+    return time.perf_counter() - start, lines, size
+
+
+def download(directory: Path) -> Path:
+    import requests
+
+    path = directory / Path(imdb_dataset_url).name
+    print(f"Downloading {imdb_dataset_url}...")
+    with requests.get(imdb_dataset_url, stream=True, timeout=15) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=READ_SIZE):
+                f.write(chunk)
+    return path
+
+
+def benchmark(path: Path, backends: list[str], runs: int) -> bool:
+    results = {}
+    for backend in backends:
+        times = []
+        for _ in range(runs):
+            seconds, lines, size = read_dataset(path, backend)
+            times.append(seconds)
+        results[backend] = (statistics.median(times), lines, size)
+
+    on_disk = path.stat().st_size
+    print(f"{path.name}: {on_disk / 1e6:.1f} MB on disk (median of {runs})")
+    fastest = min(seconds for seconds, _, _ in results.values())
+    for backend, (seconds, lines, size) in results.items():
+        print(
+            f"  {backend:6} {seconds:7.2f}s  {size / seconds / 1e6:7.1f} MB/s  "
+            f"{seconds / fastest:5.2f}x  {lines} lines"
+        )
+
+    if len({(lines, size) for _, lines, size in results.values()}) > 1:
+        print("Backends disagree on the dataset's content")
+        return False
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the speed of the dataset decompression backends"
+    )
+    parser.add_argument("dataset", type=Path, nargs="?", help="IMDb dataset")
+    parser.add_argument(
+        "--download",
+        action="store_true",
+        help="download the dataset to a temporary directory and use it",
+    )
+    parser.add_argument("-n", "--runs", type=int, default=3, help="number of runs")
+    parser.add_argument(
+        "-b",
+        "--backend",
+        action="append",
+        choices=available_backends(),
+        help="backend to benchmark; by default all available backends",
+    )
+    args = parser.parse_args()
+
+    if args.dataset is None and not args.download:
+        parser.error("a dataset, or --download, is required")
+    backends = args.backend or available_backends()
+
+    if args.download:
+        with tempfile.TemporaryDirectory() as directory:
+            ok = benchmark(download(Path(directory)), backends, args.runs)
+    else:
+        ok = benchmark(args.dataset, backends, args.runs)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
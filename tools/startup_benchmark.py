@@ -0,0 +1,128 @@
+#  SPDX-FileCopyrightText: 2026 Damon Lynch <damonlynch@gmail.com>
+#  SPDX-License-Identifier: GPL-3.0-or-later
+
+# Measure the program's import time and its time to first window, so that startup
+# latency can be tracked across releases. Exits with status 1 when a budget is
+# exceeded.
+#
+# The time to first window is measured by launching the program, which must not
+# already be running. On a machine without a display, set QT_QPA_PLATFORM=offscreen.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+main_module = "modestmoviemetadata.modestmoviemetadata"
+startup_benchmark_env_var = "MODEST_MOVIE_METADATA_STARTUP_BENCHMARK"
+
+# Modules that must not be imported until they are first used
+deferred_modules = ("requests", "arrow", "PySide6.QtMultimedia")
+
+
+def import_time() -> tuple[float, list[tuple[int, str]]]:
+    """
+    :return: cumulative import time of the main module in seconds, and the self
+     time in microseconds of each module it imported
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {main_module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append((int(self_us), name.strip()))
+        if name.strip() == main_module:
+            total = int(cumulative_us) / 1_000_000
+    return total, modules
+
+
+def eagerly_imported() -> list[str]:
+    code = (
+        f"import sys, {main_module}; "
+        f"print(*(m for m in {deferred_modules!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def time_to_first_window() -> float:
+    env = os.environ | {startup_benchmark_env_var: "1"}
+    result = subprocess.run(
+        [sys.executable, "-m", main_module],
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=120,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("time_to_first_window="):
+            return float(line.split("=", 1)[1])
+    raise RuntimeError(
+        "The program did not report its time to first window. Is it already running?"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the program's import time and time to first window"
+    )
+    parser.add_argument("-n", "--runs", type=int, default=5, help="number of runs")
+    parser.add_argument(
+        "--import-budget", type=float, help="maximum median import time in seconds"
+    )
+    parser.add_argument(
+        "--window-budget",
+        type=float,
+        help="maximum median time to first window in seconds",
+    )
+    parser.add_argument(
+        "--no-window",
+        action="store_true",
+        help="measure import time only, without launching the program",
+    )
+    args = parser.parse_args()
+
+    ok = True
+
+    eager = eagerly_imported()
+    if eager:
+        print(f"Imported at startup, but should be deferred: {', '.join(eager)}")
+        ok = False
+
+    runs = [import_time() for _ in range(args.runs)]
+    import_median = statistics.median(total for total, _ in runs)
+    print(f"Import time (median of {args.runs}): {import_median:.3f}s")
+    print("Slowest modules to import (last run, self time):")
+    for self_us, name in sorted(runs[-1][1], reverse=True)[:10]:
+        print(f"  {self_us / 1000:8.1f}ms  {name}")
+    if args.import_budget is not None and import_median > args.import_budget:
+        print(f"Import time exceeds budget of {args.import_budget:.3f}s")
+        ok = False
+
+    if not args.no_window:
+        window_times = [time_to_first_window() for _ in range(args.runs)]
+        window_median = statistics.median(window_times)
+        print(
+            f"Time to first window (median of {args.runs}): {window_median:.3f}s "
+            f"(min {min(window_times):.3f}s, max {max(window_times):.3f}s)"
+        )
+        if args.window_budget is not None and window_median > args.window_budget:
+            print(f"Time to first window exceeds budget of {args.window_budget:.3f}s")
+            ok = False
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())